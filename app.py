@@ -1,34 +1,13 @@
 import streamlit as st
-import base64
+from pbm import assets, startup
 
 st.set_page_config(page_title="PBM Optimization", page_icon="💊", layout="centered")
 
-# Function to set background from local file
-def set_background(image_file):
-    with open(image_file, "rb") as f:
-        encoded = base64.b64encode(f.read()).decode()
-    bg_img = f"""
-    <style>
-    [data-testid="stAppViewContainer"] {{
-        background-image: url("data:image/jpg;base64,{encoded}");
-        background-size: cover;
-        background-repeat: no-repeat;
-        background-attachment: fixed;
-    }}
-
-    [data-testid="stHeader"] {{
-        background: rgba(0,0,0,0);
-    }}
-
-    [data-testid="stToolbar"] {{
-        right: 2rem;
-    }}
-    </style>
-    """
-    st.markdown(bg_img, unsafe_allow_html=True)
+# preload datasets, index and model in the background, once per process
+startup.warm_up()
 
 # Call background setter
-set_background("data/frontpage.jpg")  # change extension if .png
+assets.set_background("data/frontpage.jpg", transparent_header=True)
 
 # Page Title
 st.markdown("<h1 style='text-align:center; color:black;'>💊 PBM Optimization</h1>", unsafe_allow_html=True)
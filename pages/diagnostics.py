@@ -0,0 +1,53 @@
+import pandas as pd
+import streamlit as st
+from pbm import assets, charts, metrics, startup
+
+
+startup.warm_up()
+assets.set_background("data/back.jpg")
+
+
+st.title("Diagnostics")
+
+snap = metrics.snapshot()
+
+recording = st.toggle("Record timings", value=snap["enabled"])
+if recording != snap["enabled"]:
+    metrics.enable() if recording else metrics.disable()
+
+col1, col2, col3 = st.columns(3)
+col1.metric("Process", snap["pid"])
+col2.metric("Peak RSS (MB)", snap["peak_rss_mb"] if snap["peak_rss_mb"] is not None else "n/a")
+col3.metric("Render cache (MB)", round(charts.cache.stats()["bytes"] / 2**20, 1))
+
+memory = snap["memory_mb"]
+if memory:
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("RSS (MB)", memory["rss"])
+    col2.metric("Shared (MB)", memory["shared"])
+    col3.metric("Private (MB)", memory["private"])
+    col4.metric("PSS (MB)", memory["pss"])
+    st.caption("Shared pages are the memory-mapped datasets, embeddings and model other workers also map.")
+
+st.subheader("Latency")
+if snap["timings"]:
+    st.dataframe(pd.DataFrame.from_dict(snap["timings"], orient="index"), use_container_width=True)
+else:
+    st.info("Nothing recorded yet. Use the other pages, then come back.")
+
+st.subheader("Caches")
+if snap["caches"]:
+    st.dataframe(pd.DataFrame.from_dict(snap["caches"], orient="index"), use_container_width=True)
+
+st.subheader("Start-up")
+steps = startup.report()
+if steps:
+    st.dataframe(pd.DataFrame(steps), use_container_width=True)
+st.caption("Warm-up finished" if startup.wait(0) else "Warm-up still running")
+
+col1, col2 = st.columns(2)
+col1.download_button("Download JSON", metrics.export_json(), file_name=f"pbm-metrics-{snap['pid']}.json",
+                     mime="application/json")
+if col2.button("Reset"):
+    metrics.reset()
+    st.rerun()
@@ -1,39 +1,33 @@
 import streamlit as st
 import pandas as pd
-import base64
-
-def set_background(image_file):
-    with open(image_file, "rb") as f:
-        encoded = base64.b64encode(f.read()).decode()
-    bg_img = f"""
-    <style>
-    [data-testid="stAppViewContainer"] {{
-        background-image: url("data:image/jpeg;base64,{encoded}");
-        background-size: cover;
-        background-repeat: no-repeat;
-        background-attachment: fixed;
-    }}
-    </style>
-    """
-    st.markdown(bg_img, unsafe_allow_html=True)
-
-
-set_background("data/back.jpg")
-@st.cache_data
+from pbm import assets, datastore, formulary_frame, startup
+
+startup.warm_up()
+assets.set_background("data/back.jpg")
+@st.cache_resource
 def load_data():
-    return pd.read_csv("data/full_dataset_with_new_avg_cost_and_score.csv")
+    columns = ["Medicine", "Drug_Cost", "Insurance_Drug", "Insurance_Saving_%", "Insurance_Drug_FinalCost"]
+    for i in range(1, 6):
+        columns += [f"Alternative {i}", f"Cost {i}"]
+    return formulary_frame.load(datastore.FORMULARY_CSV, columns=columns)
+
+
+@st.cache_resource
+def build_row_index(_df):
+    return formulary_frame.RowIndex(_df["Medicine"])
 
 df = load_data()
+rows = build_row_index(df)
 
 st.title("💊 Formulary Impact Analysis")
 
 
-drug_list = sorted(df['Medicine'].dropna().unique().tolist())
+drug_list = sorted(rows.names())
 selected_drugs = st.multiselect("Select Drug(s):", drug_list)
 
 if selected_drugs:
    
-    selected_data = df[df['Medicine'].isin(selected_drugs)]
+    selected_data = rows.take(df, selected_drugs)
 
     
     st.subheader("📌 Base Drug Costs (USD)")
@@ -60,27 +54,15 @@ if selected_drugs:
     else:
         
         st.subheader("🔄 Suggested Cheaper Alternatives (USD)")
-        alt_suggestions = []
-
-        for _, row in selected_data.iterrows():
-            base_drug = row['Medicine']
-            base_cost = row['Drug_Cost']
-            alt_costs = []
-
-            for i in range(1, 6):
-                alt_name = row.get(f'Alternative {i}')
-                alt_price = row.get(f'Cost {i}')
-                if pd.notna(alt_name) and pd.notna(alt_price):
-                    alt_costs.append((alt_name, alt_price))
-
-            if alt_costs:
-                
-                cheapest_alt = sorted(alt_costs, key=lambda x: x[1])[0]
-                if cheapest_alt[1] < base_cost:
-                    alt_suggestions.append([base_drug, base_cost, cheapest_alt[0], cheapest_alt[1]])
-
-        if alt_suggestions:
-            alt_df = pd.DataFrame(alt_suggestions, columns=["Base Drug", "Base Cost (USD)", "Cheapest Alternative", "Alternative Cost (USD)"])
+        cheaper = selected_data[selected_data['cheapest_cost'] < selected_data['Drug_Cost']]
+        alt_df = pd.DataFrame({
+            "Base Drug": cheaper['Medicine'].to_numpy(),
+            "Base Cost (USD)": cheaper['Drug_Cost'].to_numpy(),
+            "Cheapest Alternative": cheaper['cheapest_alt'].to_numpy(),
+            "Alternative Cost (USD)": cheaper['cheapest_cost'].to_numpy(),
+        })
+
+        if not alt_df.empty:
             st.write(alt_df)
 
             total_alt_cost = alt_df['Alternative Cost (USD)'].sum()
@@ -1,40 +1,26 @@
 import streamlit as st
-import pandas as pd
-import numpy as np
-import pickle
-import matplotlib.pyplot as plt
-import base64
+from pbm import assets, charts, cube, datastore, models, rollups, startup, trend
 
 
-def set_background(image_file):
-    with open(image_file, "rb") as f:
-        encoded = base64.b64encode(f.read()).decode()
-    bg_img = f"""
-    <style>
-    [data-testid="stAppViewContainer"] {{
-        background-image: url("data:image/jpeg;base64,{encoded}");
-        background-size: cover;
-        background-repeat: no-repeat;
-        background-attachment: fixed;
-    }}
-    </style>
-    """
-    st.markdown(bg_img, unsafe_allow_html=True)
+startup.warm_up()
+assets.set_background("data/back.jpg")
 
 
-set_background("data/back.jpg")
+model_path = "data/drug_trend3rd.pkl"
+# once per process and model version; reruns only stat the file
+loaded_model = models.get_model(model_path)
+rf_model, label_encoders = loaded_model.predictor, loaded_model.encoders
 
 
-model_path = "data/drug_trend3rd.pkl"
-with open(model_path, "rb") as f:
-    saved = pickle.load(f)
+data_path = "data/synthetic_drug_data_with_year_month.csv"
 
-rf_model = saved["model"]
-label_encoders = saved["encoders"]
 
+@st.cache_resource
+def load_data(path):
+    return datastore.load_frame(path, categorical=True)
 
-data_path = "data/synthetic_drug_data_with_year_month.csv"
-df = pd.read_csv(data_path)
+
+df = load_data(data_path)
 
 st.title("Drug Cost Prediction & Trend Analysis")
 
@@ -58,61 +44,35 @@ if option == "Predict Future Trend":
         default=list(range(1,13))
     )
 
+    simulate = st.checkbox("Show confidence band (Monte Carlo)")
+    if simulate:
+        n_scenarios = st.slider("Scenarios", 100, 5000, trend.SCENARIOS, step=100)
+        seed = st.number_input("Seed", value=0, step=1)
+
     if not selected_months:
         st.warning("Please select at least one month.")
+    elif simulate:
+        # one batched predict over all scenarios; large batches go to sklearn
+        rows = n_scenarios * len(selected_months)
+        bands = trend.simulate(df, loaded_model.batch_predictor(rows), label_encoders, selected_drug, selected_year,
+                               sorted(selected_months), n_scenarios, int(seed))
+        if bands is not None:
+            st.subheader(f"Predicted Cost Range for {selected_drug} in {selected_year}")
+            st.line_chart(bands.set_index("Month")[["p5", "p50", "p95"]])
+            st.dataframe(bands)
     else:
        
-        drug_df = df[df["drugname"] == selected_drug]
-
-        if not drug_df.empty:
-            
-            avg_values = {
-                "season": drug_df["season"].mode()[0],
-                "alternatedrug": drug_df["alternatedrug"].mode()[0],
-                "alternatedrugcost": drug_df["alternatedrugcost"].mean(),
-                "no_of_customer_using_drug": drug_df["no_of_customer_using_drug"].mode()[0],
-                "no_of_customer_using_alternate_drug": drug_df["no_of_customer_using_alternate_drug"].mode()[0]
-            }
-
-            
-            variation = 0.1  
-
-            future_df = pd.DataFrame({
-                "season": [avg_values["season"]] * len(selected_months),
-                "drugname": [selected_drug] * len(selected_months),
-                "alternatedrug": [avg_values["alternatedrug"]] * len(selected_months),
-                "alternatedrugcost": [
-                    np.round(avg_values["alternatedrugcost"] * np.random.uniform(1-variation, 1+variation), 2)
-                    for _ in selected_months
-                ],
-                "no_of_customer_using_drug": [
-                    int(avg_values["no_of_customer_using_drug"] * np.random.uniform(1-variation, 1+variation))
-                    for _ in selected_months
-                ],
-                "no_of_customer_using_alternate_drug": [
-                    int(avg_values["no_of_customer_using_alternate_drug"] * np.random.uniform(1-variation, 1+variation))
-                    for _ in selected_months
-                ],
-                "Year": [selected_year] * len(selected_months),
-                "Month": selected_months,
-                "YearMonth": [f"{selected_year}-{m:02d}" for m in selected_months]  
-            })
-
-
-
-                    
-           
-
-           
-            cat_cols = ["season", "drugname", "alternatedrug", "YearMonth"]
-            for col in cat_cols:
-                le = label_encoders[col]
-                future_df[col] = future_df[col].apply(lambda x: x if x in le.classes_ else le.classes_[0])
-                future_df[col] = le.transform(future_df[col])
-
-            future_df["drugcost"] = rf_model.predict(future_df)
-
-            
+        # sliced from the precomputed cube (built by the warm-up or python -m pbm.cube);
+        # until it exists, predict this drug directly
+        try:
+            future_df = cube.load_cube(model_path, data_path, build_missing=False).frame(
+                selected_drug, selected_year, selected_months)
+        except FileNotFoundError:
+            future_df = None
+        if future_df is None:
+            future_df = trend.forecast(df, rf_model, label_encoders, selected_drug, selected_year, selected_months)
+
+        if future_df is not None:
             st.subheader(f"Predicted Future Trend for {selected_drug} in {selected_year}")
             st.dataframe(future_df[[ "Month", "no_of_customer_using_drug", "drugcost"]])
 
@@ -124,30 +84,16 @@ elif option == "Understand the Pattern":
     selected_year = st.slider("Select Year", int(df["Year"].min()), int(df["Year"].max()))
 
    
-    pattern_df = df[(df["drugname"] == selected_drug) & (df["Year"] == selected_year)]
+    # (drug, year, month) rollup: an index lookup instead of mask + groupby
+    pattern_df = rollups.load_rollups(data_path).usage(selected_drug, selected_year)
 
     if not pattern_df.empty:
-       
-        pattern_df = (
-            pattern_df.groupby("Month", as_index=False)[
-                ["no_of_customer_using_drug", "no_of_customer_using_alternate_drug"]
-            ].sum()
-        )
 
         
-        pattern_df = pattern_df.sort_values("Month")
-
-        
-        fig, ax = plt.subplots(figsize=(10, 6))
-        ax.plot(pattern_df["Month"], pattern_df["no_of_customer_using_drug"], marker='o', color='blue', label='Normal drug user')
-        ax.plot(pattern_df["Month"], pattern_df["no_of_customer_using_alternate_drug"], marker='o', color='red', label='Alternate drug user')
-
-        ax.set_xlabel("Month")
-        ax.set_ylabel("Number of Users")
-        ax.set_title(f"User Trend for {selected_drug} in {selected_year}")
-        ax.legend()
-        ax.grid(True)
-        st.pyplot(fig)
+        # rendered once per (chart, drug, year, data version), then served from the LRU
+        chart_key = (selected_drug, selected_year, datastore.file_hash(data_path))
+        st.image(charts.cache.get(("trend",) + chart_key, charts.usage_trend(pattern_df, selected_drug, selected_year), (10, 6)),
+                 use_container_width=True)
 
         
         total_customers_drug = pattern_df["no_of_customer_using_drug"].sum()
@@ -157,12 +103,9 @@ elif option == "Understand the Pattern":
         st.write(f"👥 Customers using **{selected_drug}**: {total_customers_drug}")
         st.write(f"👥 Customers using **alternate drug**: {total_customers_alt}")
 
-        fig2, ax2 = plt.subplots(figsize=(6, 4))
-        ax2.bar(["Normal Drug", "Alternate Drug"], [total_customers_drug, total_customers_alt], 
-                color=["blue", "red"])
-        ax2.set_ylabel("Number of Customers")
-        ax2.set_title(f"Customer Usage in {selected_year}")
-        st.pyplot(fig2)
+        st.image(charts.cache.get(("totals",) + chart_key,
+                                  charts.usage_totals(total_customers_drug, total_customers_alt, selected_year), (6, 4)),
+                 use_container_width=True)
 
     else:
         st.warning("No data available for this drug and year.")
@@ -179,19 +122,10 @@ elif option == "Seasonal Drug Sales Analysis":
     selected_years = st.multiselect("Select Year(s)", sorted(years), default=[years.min()])
 
    
-    filtered_df = df[(df["season"] == selected_season) & (df["Year"].isin(selected_years))]
+    # (season, year, drug) rollup, combined over the selected years
+    result = rollups.load_rollups(data_path).seasonal(selected_season, selected_years)
 
-    if not filtered_df.empty:
-        
-        result = (
-            filtered_df.groupby("drugname")
-            .agg(
-                total_customers=("no_of_customer_using_drug", "sum"),
-                avg_cost=("drugcost", "mean")
-            )
-            .reset_index()
-            .sort_values(by="total_customers", ascending=False)   
-        )
+    if not result.empty:
 
         st.subheader(f"📌 Drugs Sold in {selected_season} for {', '.join(map(str, selected_years))}")
         st.dataframe(result)
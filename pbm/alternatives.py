@@ -0,0 +1,91 @@
+"""Vectorized cheapest-alternative computation over the formulary frame.
+
+All ``Cost 1..5`` columns are parsed in bulk and the cheapest valid alternative
+of every row is picked with one ``argmin``, so pages only index into arrays.
+"""
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+N_ALTERNATIVES = 5
+ALT_COLUMNS = [f"Alternative {j}" for j in range(1, N_ALTERNATIVES + 1)]
+COST_COLUMNS = [f"Cost {j}" for j in range(1, N_ALTERNATIVES + 1)]
+
+Cheapest = namedtuple("Cheapest", ["alternative", "cost", "base_cost", "savings"])
+
+
+def parse_costs(values, missing=np.inf):
+    """Parse a column of prices ("₹12.50", 12.5, "NULL", ...) to float64.
+
+    Anything that is not a single well-formed number becomes ``missing``;
+    the default ``inf`` never wins a minimum.
+    """
+    s = pd.Series(values, copy=False)
+    if pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+        out = s.to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+    else:
+        cleaned = s.astype(str).str.replace(r"[^0-9.]", "", regex=True)
+        bad = (cleaned.str.count(r"\.") > 1) | (cleaned == "")
+        out = pd.to_numeric(cleaned.mask(bad), errors="coerce").to_numpy(
+            dtype=np.float64, na_value=np.nan, copy=True
+        )
+    out[~np.isfinite(out)] = missing
+    return out
+
+
+def _clean_names(values):
+    s = pd.Series(values, copy=False)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # clean each distinct name once, then gather by code
+        names, valid = _clean_names(s.cat.categories.astype(object))
+        codes = s.cat.codes.to_numpy()
+        names, valid = np.append(names, ""), np.append(valid, False)
+        return names[codes], valid[codes]
+    s = s.astype(object)
+    names = s.where(s.notna(), "").astype(str).str.strip()
+    valid = (names != "") & (names.str.upper() != "NULL")
+    return names.to_numpy(dtype=object), valid.to_numpy(dtype=bool)
+
+
+def cheapest_alternatives(df):
+    """Cheapest listed alternative, its cost and the savings for every row.
+
+    Rows without any valid alternative get ``None`` / ``inf``; savings are
+    ``base_cost - cost`` and therefore ``-inf`` for those rows.
+    """
+    n = len(df)
+    costs = np.full((n, N_ALTERNATIVES), np.inf)
+    names = np.empty((n, N_ALTERNATIVES), dtype=object)
+    for j, (a_col, c_col) in enumerate(zip(ALT_COLUMNS, COST_COLUMNS)):
+        if a_col not in df.columns or c_col not in df.columns:
+            continue
+        col_names, valid = _clean_names(df[a_col])
+        col_costs = parse_costs(df[c_col])
+        col_costs[~valid] = np.inf
+        costs[:, j] = col_costs
+        names[:, j] = col_names
+
+    best = costs.argmin(axis=1) if n else np.zeros(0, dtype=np.intp)
+    rows = np.arange(n)
+    cost = costs[rows, best]
+    alternative = names[rows, best]
+    alternative[~np.isfinite(cost)] = None
+
+    if "Drug_Cost" in df.columns:
+        base_cost = parse_costs(df["Drug_Cost"])
+    else:
+        base_cost = np.full(n, np.nan)
+    with np.errstate(invalid="ignore"):
+        savings = base_cost - cost
+    return Cheapest(alternative, cost, base_cost, savings)
+
+
+def annotate(df):
+    """Attach the cheapest-alternative arrays to ``df`` as derived columns."""
+    cheapest = cheapest_alternatives(df)
+    df["cheapest_alt"] = cheapest.alternative
+    df["cheapest_cost"] = cheapest.cost
+    df["base_cost"] = cheapest.base_cost
+    df["savings"] = cheapest.savings
+    return df
@@ -0,0 +1,192 @@
+"""Nearest-neighbor backends for the equivalence search.
+
+Every backend takes the embedding matrix and answers ``kneighbors(X,
+n_neighbors)`` with cosine distances, the same interface as
+``sklearn.neighbors.NearestNeighbors(metric="cosine")``:
+
+* ``exact`` - brute force over the normalized matrix
+* ``ivf``   - inverted file: spherical k-means partitions the rows into
+  ``n_lists`` cells and a query only scans the ``n_probe`` closest cells.
+  Raise ``n_probe`` for recall, lower it for latency.
+
+Pass ``normalized=True`` with already row-normalized (e.g. memory-mapped)
+embeddings to use them without a private copy.  Rows added later (``add``)
+go to a small in-memory ``added`` segment that is searched exhaustively and
+merged with the answer from the fitted rows, which are never copied.
+
+``python -m pbm.ann`` prints a recall@k / latency report of ``ivf`` against
+``exact`` on the current index.
+"""
+import argparse
+import json
+import time
+
+import numpy as np
+
+from pbm.neighbors import normalize
+
+
+def _top_k(sims, k):
+    k = min(k, sims.shape[-1])
+    part = np.argpartition(-sims, k - 1, axis=-1)[..., :k]
+    part_sims = np.take_along_axis(sims, part, axis=-1)
+    order = np.argsort(-part_sims, axis=-1, kind="stable")
+    return np.take_along_axis(part, order, axis=-1), np.take_along_axis(part_sims, order, axis=-1)
+
+
+class _Added:
+    """The in-memory segment of rows added after the backend was built."""
+
+    def _init_added(self):
+        self.added = np.zeros((0, self.unit.shape[1]), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.unit) + len(self.added)
+
+    def add(self, embeddings, normalized=False):
+        """Append rows; their ids continue after the existing ones."""
+        unit = np.asarray(embeddings, dtype=np.float32) if normalized else normalize(embeddings)
+        self.added = np.concatenate([self.added, unit])
+
+    def _merge_added(self, q, k, idx, sims):
+        # ties keep the fitted rows first, like a search over one matrix
+        if not len(self.added):
+            return idx, sims
+        add_idx, add_sims = _top_k(q @ self.added.T, k)
+        idx = np.hstack([idx, add_idx + len(self.unit)])
+        sims = np.hstack([sims, add_sims])
+        order = np.argsort(-sims, axis=-1, kind="stable")[..., :k]
+        return np.take_along_axis(idx, order, axis=-1), np.take_along_axis(sims, order, axis=-1)
+
+
+class ExactIndex(_Added):
+    def __init__(self, embeddings, n_neighbors=6, normalized=False):
+        self.n_neighbors = n_neighbors
+        self.unit = embeddings if normalized else normalize(embeddings)
+        self._init_added()
+
+    def kneighbors(self, X, n_neighbors=None):
+        k = n_neighbors or self.n_neighbors
+        q = normalize(np.atleast_2d(X))
+        idx, sims = self._merge_added(q, k, *_top_k(q @ self.unit.T, k))
+        return 1.0 - sims, idx
+
+
+class IVFIndex(_Added):
+    def __init__(self, embeddings, n_neighbors=6, n_lists=None, n_probe=8,
+                 n_iter=10, sample_size=None, seed=42, normalized=False):
+        self.n_neighbors = n_neighbors
+        self.n_probe = n_probe
+        self.unit = embeddings if normalized else normalize(embeddings)
+        self._init_added()
+        n = len(self.unit)
+        self.n_lists = max(1, min(n, n_lists or int(4 * np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+
+        sample_size = sample_size or 256 * self.n_lists
+        train = self.unit
+        if n > sample_size:
+            train = self.unit[rng.choice(n, sample_size, replace=False)]
+        self.centroids = self._kmeans(train, n_iter, rng)
+
+        assign = self._assign(self.unit)
+        self.order = np.argsort(assign, kind="stable").astype(np.int64)
+        self.offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assign, minlength=self.n_lists), out=self.offsets[1:])
+
+    def _assign(self, x, chunk_size=8192):
+        out = np.empty(len(x), dtype=np.int64)
+        for start in range(0, len(x), chunk_size):
+            out[start:start + chunk_size] = np.argmax(x[start:start + chunk_size] @ self.centroids.T, axis=1)
+        return out
+
+    def _kmeans(self, x, n_iter, rng):
+        self.centroids = x[rng.choice(len(x), self.n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            assign = self._assign(x)
+            sums = np.zeros_like(self.centroids)
+            np.add.at(sums, assign, x)
+            empty = np.bincount(assign, minlength=self.n_lists) == 0
+            sums[empty] = x[rng.choice(len(x), int(empty.sum()))]
+            self.centroids = normalize(sums)
+        return self.centroids
+
+    def list_sizes(self):
+        return np.diff(self.offsets)
+
+    def kneighbors(self, X, n_neighbors=None, n_probe=None):
+        k = n_neighbors or self.n_neighbors
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+        q = normalize(np.atleast_2d(X))
+        k_fitted = min(k, len(self.unit))
+        cell_order = np.argsort(-(q @ self.centroids.T), axis=1)
+        sizes = self.list_sizes()
+
+        sims = np.empty((len(q), k_fitted), dtype=np.float32)
+        indices = np.empty((len(q), k_fitted), dtype=np.int64)
+        for i, cells in enumerate(cell_order):
+            # probe at least n_probe cells, more if they hold fewer than k rows
+            enough = np.searchsorted(np.cumsum(sizes[cells]), k_fitted) + 1
+            cells = cells[: max(n_probe, enough)]
+            cand = np.concatenate([self.order[self.offsets[c]:self.offsets[c + 1]] for c in cells])
+            idx, sims[i] = _top_k(self.unit[cand] @ q[i], k_fitted)
+            indices[i] = cand[idx]
+        indices, sims = self._merge_added(q, k, indices, sims)
+        return 1.0 - sims, indices
+
+
+BACKENDS = {"exact": ExactIndex, "ivf": IVFIndex}
+
+
+def make_index(embeddings, backend="exact", **params):
+    try:
+        cls = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"Unknown ANN backend '{backend}', choose from {sorted(BACKENDS)}")
+    return cls(embeddings, **params)
+
+
+def recall_at_k(approx, exact, queries, k=10):
+    """Recall@k of ``approx`` against ``exact`` plus per-query latency of both."""
+    start = time.perf_counter()
+    _, truth = exact.kneighbors(queries, n_neighbors=k)
+    exact_s = time.perf_counter() - start
+    start = time.perf_counter()
+    _, found = approx.kneighbors(queries, n_neighbors=k)
+    approx_s = time.perf_counter() - start
+
+    hits = sum(len(np.intersect1d(t, f)) for t, f in zip(truth, found))
+    return {
+        "k": k,
+        "queries": len(queries),
+        "recall": round(hits / (k * len(queries)), 4),
+        "exact_ms_per_query": round(1000 * exact_s / len(queries), 4),
+        "approx_ms_per_query": round(1000 * approx_s / len(queries), 4),
+    }
+
+
+def main(argv=None):
+    from pbm import datastore, equivalence_index
+
+    parser = argparse.ArgumentParser(description="Recall/latency report of the IVF backend.")
+    parser.add_argument("--csv", default=datastore.FORMULARY_CSV)
+    parser.add_argument("--n-lists", type=int, default=None)
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    embeddings = equivalence_index.load_index(args.csv).embeddings
+    rng = np.random.default_rng(0)
+    queries = embeddings[rng.choice(len(embeddings), min(args.queries, len(embeddings)), replace=False)]
+    exact = ExactIndex(embeddings)
+    start = time.perf_counter()
+    ivf = IVFIndex(embeddings, n_lists=args.n_lists)
+    print(f"ivf: {ivf.n_lists} lists built in {time.perf_counter() - start:.2f}s")
+    for n_probe in args.n_probe:
+        ivf.n_probe = n_probe
+        print(json.dumps({"n_probe": n_probe, **recall_at_k(ivf, exact, queries, args.k)}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Publishing and locking of the on-disk artifacts under ``data/cache/``.
+
+Every artifact is built in a temporary directory next to its target and moved
+into place with ``publish``.  A target another loader may already be reading
+is never deleted first: a stale one is renamed aside (open mappings keep
+working) and removed only after the new build is in place, and a failed move
+means another builder won the race, whose result is kept.
+
+``build_lock`` gives each target one in-process lock, so the warm-up thread
+and page loaders wait for a single build instead of racing.
+
+Artifacts are keyed on ``file_hash`` of their sources.  This module only uses
+the standard library, so pages that merely need a hash (the background
+images) do not import numpy or pandas.
+"""
+import hashlib
+import os
+import shutil
+import threading
+
+_hash_memo = {}
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def file_hash(path):
+    """sha256 of a file, memoised on (size, mtime) so reruns skip re-hashing."""
+    st = os.stat(path)
+    key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    digest = _hash_memo.get(key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+        digest = h.hexdigest()
+        _hash_memo[key] = digest
+    return digest
+
+
+def build_lock(directory):
+    """The process-wide lock for building the artifact at ``directory``."""
+    key = os.path.abspath(directory)
+    with _locks_lock:
+        lock = _locks.get(key)
+        if lock is None:
+            lock = _locks[key] = threading.Lock()
+        return lock
+
+
+def publish(tmp, target, replace=False):
+    """Move the finished build ``tmp`` to ``target``; returns ``target``.
+
+    With ``replace`` an existing (stale) target is swapped out; otherwise an
+    existing target is kept and ``tmp`` discarded.
+    """
+    aside = None
+    if replace and os.path.exists(target):
+        aside = f"{tmp}.old"
+        try:
+            os.replace(target, aside)
+        except OSError:
+            aside = None
+    try:
+        os.replace(tmp, target)
+    except OSError:
+        # another builder finished the same artifact first
+        shutil.rmtree(tmp, ignore_errors=True)
+    if aside is not None:
+        shutil.rmtree(aside, ignore_errors=True)
+    return target
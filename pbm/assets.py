@@ -0,0 +1,133 @@
+"""Background images for the app and its pages.
+
+``set_background(image)`` replaces the per-page copies that read, base64
+encoded and inlined the full image on every rerun:
+
+* the image is downscaled and recompressed once per process (and only
+  rebuilt when the source changes) into ``static/<name>-<hash>-<width>.jpg``;
+* the CSS is built once per image and process;
+* with ``server.enableStaticServing`` on (see ``.streamlit/config.toml``) the
+  CSS points at ``app/static/...`` so the browser fetches and caches the file
+  itself; otherwise the smallest sufficient variant is inlined.
+
+    python -m pbm.assets    # prepare the variants ahead of the first request
+"""
+import base64
+import os
+import shutil
+import threading
+
+from pbm import artifacts
+
+STATIC_DIR = "static"
+STATIC_URL = "app/static"
+WIDTHS = (1920, 1280, 768)
+QUALITY = 80
+BACKGROUNDS = ("data/frontpage.jpg", "data/back.jpg")
+
+_variants = {}
+_css = {}
+_lock = threading.Lock()
+
+
+def _variant_name(image_file, digest, width):
+    stem = os.path.splitext(os.path.basename(image_file))[0]
+    return f"{stem}-{digest[:8]}-{width}.jpg"
+
+
+def prepare(image_file, widths=WIDTHS, quality=QUALITY):
+    """Write the downscaled JPEG variants of ``image_file``; returns
+    ``[(width, filename), ...]`` largest first."""
+    digest = artifacts.file_hash(image_file)
+    key = (os.path.abspath(image_file), digest)
+    with _lock:
+        if key in _variants:
+            return _variants[key]
+        os.makedirs(STATIC_DIR, exist_ok=True)
+        try:
+            from PIL import Image
+        except ImportError:
+            Image = None
+        out = []
+        if Image is None:
+            name = _variant_name(image_file, digest, "orig")
+            if not os.path.exists(os.path.join(STATIC_DIR, name)):
+                shutil.copyfile(image_file, os.path.join(STATIC_DIR, name))
+            out.append((None, name))
+        else:
+            with Image.open(image_file) as img:
+                img = img.convert("RGB")
+                for width in sorted(widths, reverse=True):
+                    name = _variant_name(image_file, digest, width)
+                    path = os.path.join(STATIC_DIR, name)
+                    if not os.path.exists(path):
+                        variant = img
+                        if img.width > width:
+                            variant = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+                        tmp = path + ".tmp"
+                        variant.save(tmp, "JPEG", quality=quality, optimize=True, progressive=True)
+                        os.replace(tmp, path)
+                    out.append((width, name))
+                    if img.width <= width:
+                        break
+        _variants[key] = out
+        return out
+
+
+def _inline(name):
+    with open(os.path.join(STATIC_DIR, name), "rb") as f:
+        return "data:image/jpeg;base64," + base64.b64encode(f.read()).decode()
+
+
+def background_css(image_file, transparent_header=False, static=True):
+    """The ``<style>`` block for ``image_file``, built once per process."""
+    digest = artifacts.file_hash(image_file)
+    key = (os.path.abspath(image_file), digest, transparent_header, static)
+    css = _css.get(key)
+    if css is not None:
+        return css
+    variants = prepare(image_file)
+    if static:
+        url = lambda name: f"{STATIC_URL}/{name}"  # noqa: E731
+    else:
+        # one inlined image: the smallest variant that still covers a laptop screen
+        variants = [variants[min(1, len(variants) - 1)]]
+        url = _inline
+    rules = [
+        '[data-testid="stAppViewContainer"] {\n'
+        f'    background-image: url("{url(variants[0][1])}");\n'
+        "    background-size: cover;\n"
+        "    background-repeat: no-repeat;\n"
+        "    background-attachment: fixed;\n"
+        "}"
+    ]
+    for width, name in variants[1:]:
+        rules.append(
+            f"@media (max-width: {width}px) {{\n"
+            f'    [data-testid="stAppViewContainer"] {{ background-image: url("{url(name)}"); }}\n'
+            "}"
+        )
+    if transparent_header:
+        rules.append('[data-testid="stHeader"] {\n    background: rgba(0,0,0,0);\n}')
+        rules.append('[data-testid="stToolbar"] {\n    right: 2rem;\n}')
+    css = "<style>\n" + "\n".join(rules) + "\n</style>"
+    _css[key] = css
+    return css
+
+
+def set_background(image_file, transparent_header=False):
+    import streamlit as st
+
+    static = bool(st.get_option("server.enableStaticServing"))
+    st.markdown(background_css(image_file, transparent_header, static), unsafe_allow_html=True)
+
+
+def main():
+    for image_file in BACKGROUNDS:
+        for width, name in prepare(image_file):
+            size = os.path.getsize(os.path.join(STATIC_DIR, name))
+            print(f"{image_file} -> {STATIC_DIR}/{name} ({width or 'original'} px, {size:,} bytes)")
+
+
+if __name__ == "__main__":
+    main()
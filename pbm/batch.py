@@ -0,0 +1,88 @@
+"""Headless batch recommendations for whole-formulary equivalence runs.
+
+    python -m pbm.batch --all --format csv --output savings.csv
+    python -m pbm.batch --names medicines.txt --format jsonl
+    python -m pbm.batch "Paracetamol 500mg Tablet" "Azithral 500 Tablet"
+
+Records are streamed as they are produced; ``run`` is the function form.
+"""
+import argparse
+import csv
+import json
+import sys
+import time
+
+from pbm import datastore
+from pbm.recommend import Recommender
+
+FIELDS = ["medicine", "status", "drug_name", "original_cost", "alternative", "alternative_cost", "savings"]
+
+
+def read_names(path):
+    """One medicine per line; a CSV with a ``Medicine`` column also works."""
+    with open(path, newline="", encoding="utf-8") as f:
+        first = f.readline()
+        f.seek(0)
+        if "Medicine" in next(csv.reader([first]), []):
+            return [row["Medicine"] for row in csv.DictReader(f)]
+        return [line.strip() for line in f if line.strip()]
+
+
+def write_records(records, out, fmt="jsonl"):
+    """Write records to the open text stream ``out``; returns the count."""
+    count = 0
+    if fmt == "csv":
+        writer = csv.DictWriter(out, fieldnames=FIELDS, extrasaction="ignore")
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            count += 1
+    elif fmt == "jsonl":
+        for record in records:
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    else:
+        raise ValueError(f"Unknown format '{fmt}', use csv or jsonl")
+    return count
+
+
+def run(names=None, csv_path=datastore.FORMULARY_CSV, recommender=None, batch_size=1024, **index_params):
+    """Yield recommendation records for ``names`` (None: the whole formulary)."""
+    recommender = recommender or Recommender.load(csv_path, **index_params)
+    yield from recommender.recommend_many(names, batch_size=batch_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch cheapest-alternative recommendations.")
+    parser.add_argument("medicines", nargs="*", help="medicine names")
+    parser.add_argument("--names", help="file with one medicine per line (or a CSV with a Medicine column)")
+    parser.add_argument("--all", action="store_true", help="every medicine in the formulary")
+    parser.add_argument("--csv", default=datastore.FORMULARY_CSV)
+    parser.add_argument("--format", choices=["csv", "jsonl"], default="jsonl")
+    parser.add_argument("--output", help="output file (default: stdout)")
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--backend", default="exact", help="exact or ivf")
+    args = parser.parse_args(argv)
+
+    if args.all:
+        names = None
+    elif args.names:
+        names = read_names(args.names)
+    elif args.medicines:
+        names = args.medicines
+    else:
+        parser.error("give medicine names, --names FILE or --all")
+
+    start = time.perf_counter()
+    records = run(names, args.csv, batch_size=args.batch_size, backend=args.backend)
+    if args.output:
+        with open(args.output, "w", newline="", encoding="utf-8") as out:
+            count = write_records(records, out, args.format)
+    else:
+        count = write_records(records, sys.stdout, args.format)
+    elapsed = time.perf_counter() - start
+    print(f"{count} records in {elapsed:.2f}s ({count / max(elapsed, 1e-9):.0f}/s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
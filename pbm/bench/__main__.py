@@ -0,0 +1,5 @@
+import sys
+
+from pbm.bench.run import main
+
+sys.exit(main())
@@ -0,0 +1,232 @@
+"""Benchmark the hot paths on synthetic data.
+
+    python -m pbm.bench 10k                       # run, write JSON
+    python -m pbm.bench 1m --save-baseline        # store as the baseline for 1m
+    python -m pbm.bench 1m --check                # exit 1 on regressions or without a baseline
+
+Cases (the functions the pages spend their time in):
+
+* ``load_data``            - ``recommend.load_frame`` from the columnar cache
+* ``build_knn``            - fit the equivalence index and build the neighbor table
+* ``recommend_and_format`` - one ``Recommender.recommend`` per medicine name
+* ``get_drug_info``        - one indexed SQLite lookup per medicine name
+* ``savings``              - ``alternatives.annotate`` plus the cheaper-alternative filter
+* ``trend_predict``        - one 12-month ``trend.forecast`` per drug
+
+Every case records per-call latency percentiles and, in one separate traced
+call, the peak Python/NumPy allocation.  Results go to
+``data/cache/bench-results/<rows>-<seed>.json``; with ``--check`` each case's
+p50 latency and peak memory are compared with the stored baseline, and more
+than ``--tolerance`` times either counts as a regression.
+
+Latencies depend on the machine, so no baselines are committed: record one on
+the machine that runs the checks (``--save-baseline`` writes
+``pbm/bench/baselines/<rows>.json``), then compare later runs against it with
+``--check``.  Without a baseline ``--check`` fails, since it has nothing to
+compare against.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import time
+import tracemalloc
+
+import numpy as np
+
+from pbm import alternatives, datastore, equivalence_index, formulary_db, models, neighbors, recommend, trend
+from pbm.bench import synthetic
+
+RESULTS_DIR = os.path.join("data", "cache", "bench-results")
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+TOLERANCE = 1.25
+# peaks of a few KB vary by more than the tolerance from run to run
+PEAK_SLACK_MB = 1.0
+QUERIES = 200
+
+
+def percentiles(samples):
+    ms = np.asarray(samples) * 1e3
+    return {
+        "calls": len(ms),
+        "mean_ms": round(float(ms.mean()), 4),
+        "p50_ms": round(float(np.percentile(ms, 50)), 4),
+        "p90_ms": round(float(np.percentile(ms, 90)), 4),
+        "p99_ms": round(float(np.percentile(ms, 99)), 4),
+        "max_ms": round(float(ms.max()), 4),
+    }
+
+
+def measure(calls, repeat=1):
+    """Time each of ``calls`` (zero-argument callables) ``repeat`` times, then
+    trace the first one for peak memory."""
+    samples = []
+    for _ in range(repeat):
+        for call in calls:
+            start = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        calls[0]()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {**percentiles(samples), "peak_mb": round(peak / 2**20, 2)}
+
+
+class Cases:
+    def __init__(self, files, seed=0, queries=QUERIES):
+        self.files = files
+        self.rng = np.random.default_rng(seed)
+        self.queries = queries
+        self._df = None
+        self._recommender = None
+
+    @property
+    def df(self):
+        if self._df is None:
+            self._df = recommend.load_frame(self.files["formulary.csv"])
+        return self._df
+
+    def names(self):
+        medicines = self.df["Medicine"].to_numpy()
+        return list(medicines[self.rng.integers(0, len(medicines), self.queries)])
+
+    def load_data(self):
+        csv = self.files["formulary.csv"]
+        datastore.open_store(csv)
+        return measure([lambda: recommend.load_frame(csv)], repeat=5)
+
+    def build_knn(self):
+        csv = self.files["formulary.csv"]
+
+        def build():
+            index = equivalence_index.EquivalenceIndex(equivalence_index.build(csv))
+            shutil.rmtree(neighbors.table_path(index.directory), ignore_errors=True)
+            return neighbors.load_table(index, self.df["cheapest_alt"].to_numpy(), self.df["cheapest_cost"].to_numpy())
+
+        return measure([build])
+
+    def recommend_and_format(self):
+        if self._recommender is None:
+            self._recommender = recommend.Recommender.load(self.files["formulary.csv"], df=self.df)
+        rec = self._recommender
+        return measure([lambda n=n: rec.recommend(n) for n in self.names()])
+
+    def get_drug_info(self):
+        conn = sqlite3.connect(self.files["formulary.db"], check_same_thread=False)
+        try:
+            return measure([lambda n=n: formulary_db.get_drug_info(conn, n) for n in self.names()])
+        finally:
+            conn.close()
+
+    def savings(self):
+        columns = ["Medicine", "Drug_Cost"] + [c for i in range(1, 6) for c in (f"Alternative {i}", f"Cost {i}")]
+        raw = datastore.load_frame(self.files["formulary.csv"], columns=columns)
+
+        def run():
+            df = alternatives.annotate(raw.copy())
+            cheaper = df[df["cheapest_cost"] < df["Drug_Cost"]]
+            return float(cheaper["Drug_Cost"].sum() - cheaper["cheapest_cost"].sum())
+
+        return measure([run], repeat=5)
+
+    def trend_predict(self):
+        loaded = models.get_model(self.files["trend.pkl"])
+        df = datastore.load_frame(self.files["trend.csv"])
+        drugs = df["drugname"].unique()
+        picks = drugs[self.rng.integers(0, len(drugs), min(self.queries, 50))]
+        predictor, encoders = loaded.predictor, loaded.encoders
+        return measure([
+            lambda d=d: trend.forecast(df, predictor, encoders, d, 2026, range(1, 13), np.random.default_rng(0))
+            for d in picks
+        ])
+
+
+CASES = ["load_data", "build_knn", "recommend_and_format", "get_drug_info", "savings", "trend_predict"]
+
+
+def run(rows, seed=0, cases=CASES, out=None, queries=QUERIES, trend_rows=None):
+    label = f"{rows}-{seed}"
+    files = synthetic.generate(out or os.path.join("data", "cache", f"bench-{label}"),
+                               synthetic.parse_rows(rows), seed,
+                               synthetic.parse_rows(trend_rows) if trend_rows else None)
+    bench = Cases(files, seed, queries)
+    results = {}
+    for name in cases:
+        start = time.perf_counter()
+        results[name] = getattr(bench, name)()
+        print(f"{name:<22} p50 {results[name]['p50_ms']:>10.3f} ms  p99 {results[name]['p99_ms']:>10.3f} ms"
+              f"  peak {results[name]['peak_mb']:>8.2f} MB  ({time.perf_counter() - start:.1f}s)")
+    return {
+        "label": label,
+        "rows": synthetic.parse_rows(rows),
+        "seed": seed,
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "results": results,
+    }
+
+
+def compare(report, baseline, tolerance=TOLERANCE):
+    """(case, metric, before, after) for every p50 or peak memory more than
+    ``tolerance`` times the baseline's."""
+    regressions = []
+    for name, result in report["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        for metric, slack in (("p50_ms", 0.0), ("peak_mb", PEAK_SLACK_MB)):
+            if metric in base and result[metric] > base[metric] * tolerance + slack:
+                regressions.append((name, metric, base[metric], result[metric]))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the PBM hot paths on synthetic data.")
+    parser.add_argument("rows", nargs="?", default="10k", help="formulary rows, e.g. 10k, 1m, 10m")
+    parser.add_argument("--trend-rows", default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--cases", default=",".join(CASES), help="comma separated subset")
+    parser.add_argument("--queries", type=int, default=QUERIES, help="names per per-call case")
+    parser.add_argument("--output", default=None, help="JSON path (default: data/cache/bench-results/)")
+    parser.add_argument("--baseline", default=None, help=f"baseline JSON (default: {BASELINE_DIR}/<rows>.json)")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--check", action="store_true", help="exit 1 if a case regressed or there is no baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    cases = [c.strip() for c in args.cases.split(",") if c.strip()]
+    unknown = set(cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+    report = run(args.rows, args.seed, cases, queries=args.queries, trend_rows=args.trend_rows)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['label']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"wrote {output}")
+
+    baseline_path = args.baseline or os.path.join(BASELINE_DIR, f"{args.rows}.json")
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(baseline_path)), exist_ok=True)
+        shutil.copyfile(output, baseline_path)
+        print(f"saved baseline {baseline_path}")
+    elif args.check:
+        if not os.path.exists(baseline_path):
+            print(f"ERROR: no baseline at {baseline_path}, nothing to check against; "
+                  f"record one with --save-baseline on this machine first")
+            return 1
+        with open(baseline_path) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for name, metric, before, after in regressions:
+            print(f"REGRESSION {name}: {metric} {before:.3f} -> {after:.3f}")
+        if regressions:
+            return 1
+        print(f"no regressions (tolerance {args.tolerance}x)")
+    return 0
@@ -0,0 +1,197 @@
+"""Seeded synthetic datasets with the real schemas.
+
+The real data files are LFS pointers in most checkouts, so benchmarks run on
+generated stand-ins of any size:
+
+* ``formulary.csv`` - the master formulary CSV (medicine, class, use, costs,
+  five alternatives, insurance columns)
+* ``formulary.db``  - the same rows loaded with ``pbm.loader``
+* ``trend.csv``     - the monthly drug usage dataset
+* ``trend.pkl``     - a small random forest and label encoders trained on it,
+  pickled like ``data/drug_trend3rd.pkl``
+
+Generation is vectorized and both CSVs are written in ``CHUNK_ROWS`` chunks,
+so 10M rows need bounded memory; the trend model trains on a sample of the
+first chunk, with encoders fitted on every possible label.
+
+    python -m pbm.bench.synthetic 1m --out data/cache/bench-1m
+"""
+import argparse
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from pbm import loader, trend
+
+CHUNK_ROWS = 1_000_000
+TREND_ROWS_PER_DRUG = 72
+YEAR_MONTHS = [f"{y}-{m:02d}" for y in range(2019, 2025) for m in range(1, 13)]
+MODEL_TRAIN_ROWS = 20_000
+
+STEMS = [
+    "Amoxi", "Azithro", "Cefu", "Cipro", "Doxy", "Metfor", "Atorva", "Rosuva", "Amlo", "Telmi",
+    "Losar", "Panto", "Omepra", "Rabe", "Parace", "Ibupro", "Diclo", "Cetiri", "Levoce", "Montelu",
+    "Salbu", "Predni", "Glime", "Sita", "Vilda", "Clopi", "Aspi", "Warfa", "Levo", "Thyro",
+]
+SUFFIXES = ["cillin", "mycin", "roxime", "floxacin", "cycline", "min", "statin", "dipine", "sartan", "zole"]
+FORMS = ["Tablet", "Capsule", "Syrup", "Injection", "Suspension"]
+STRENGTHS = ["5mg", "10mg", "20mg", "40mg", "100mg", "250mg", "500mg", "650mg"]
+CLASSES = [
+    "ANTI INFECTIVES", "CARDIAC", "ANTI DIABETIC", "GASTRO INTESTINAL", "PAIN ANALGESICS",
+    "RESPIRATORY", "NEURO CNS", "HORMONES", "BLOOD RELATED", "VITAMINS MINERALS",
+]
+USES = [
+    "Treatment of Bacterial infections", "Hypertension", "Type 2 diabetes mellitus",
+    "Peptic ulcer disease", "Pain relief", "Asthma", "Allergic conditions", "Hypothyroidism",
+    "Prevention of heart attack and stroke", "Fever",
+]
+SEASONS = ["Winter", "Summer", "Monsoon", "Autumn"]
+INSURERS = ["MediCare Plus", "HealthFirst", "CarePoint", "SecureLife", "NULL"]
+
+
+def parse_rows(text):
+    """'10k', '2.5m', '10000' -> int."""
+    text = str(text).strip().lower().replace("_", "")
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def _pick(rng, values, n):
+    return np.asarray(values, dtype=object)[rng.integers(0, len(values), n)]
+
+
+def medicine_names(ids):
+    """Deterministic unique medicine name for each integer id."""
+    i = np.asarray(ids)
+    stem = np.asarray(STEMS, dtype=object)[i % len(STEMS)]
+    suffix = np.asarray(SUFFIXES, dtype=object)[(i // len(STEMS)) % len(SUFFIXES)]
+    strength = np.asarray(STRENGTHS, dtype=object)[(i // 300) % len(STRENGTHS)]
+    form = np.asarray(FORMS, dtype=object)[(i // 2400) % len(FORMS)]
+    return stem + suffix + " " + strength + " " + form + " " + pd.Series(i).map("{:x}".format).to_numpy(dtype=object)
+
+
+def formulary_frame(start, n, total, rng):
+    """Formulary rows ``start .. start+n`` of a ``total``-row dataset."""
+    names = medicine_names(np.arange(start, start + n))
+    base = np.round(rng.lognormal(4.0, 1.0, n), 2)
+    df = pd.DataFrame({
+        "id": np.arange(start, start + n),
+        "Medicine": names,
+        "Therapeutic Class": _pick(rng, CLASSES, n),
+        "use": _pick(rng, USES, n),
+        "Drug_Cost": base,
+    })
+    for j in range(1, 6):
+        alt = medicine_names(rng.integers(0, total, n))
+        cost = np.round(base * rng.uniform(0.4, 1.3, n), 2).astype(object)
+        missing = rng.random(n) < 0.15 * j
+        alt[missing] = "NULL"
+        cost[missing] = "NULL"
+        df[f"Alternative {j}"] = alt
+        df[f"Cost {j}"] = cost
+    insurer = _pick(rng, INSURERS, n)
+    saving = np.round(rng.uniform(0, 40, n), 1)
+    df["Insurance_Drug"] = insurer
+    df["Insurance_Saving_%"] = np.where(insurer == "NULL", 0.0, saving)
+    df["Insurance_Drug_FinalCost"] = np.round(base * (1 - df["Insurance_Saving_%"] / 100), 2)
+    return df
+
+
+def trend_frame(n, rng, base_cost=None):
+    """``n`` monthly usage rows, 2019-2024, over the drugs priced by
+    ``base_cost`` (default: ``n / 72`` random ones)."""
+    if base_cost is None:
+        base_cost = rng.lognormal(4.0, 0.8, max(1, n // TREND_ROWS_PER_DRUG))
+    n_drugs = len(base_cost)
+    drug = rng.integers(0, n_drugs, n)
+    year = rng.integers(2019, 2025, n)
+    month = rng.integers(1, 13, n)
+    names = medicine_names(np.arange(n_drugs))
+    customers = rng.integers(20, 500, n)
+    season = np.asarray(SEASONS, dtype=object)[(month % 12) // 3]
+    return pd.DataFrame({
+        "season": season,
+        "drugname": names[drug],
+        "alternatedrug": names[(drug + 1) % n_drugs],
+        "alternatedrugcost": np.round(base_cost[(drug + 1) % n_drugs] * rng.uniform(0.8, 1.2, n), 2),
+        "no_of_customer_using_drug": customers,
+        "no_of_customer_using_alternate_drug": rng.integers(10, 400, n),
+        "Year": year,
+        "Month": month,
+        "YearMonth": pd.Categorical.from_codes((year - 2019) * 12 + month - 1, YEAR_MONTHS),
+        "drugcost": np.round(base_cost[drug] * (1 + 0.03 * (year - 2019)) * (1 + 0.05 * np.sin(month)), 2),
+    })
+
+
+def train_model(df, seed, classes=None):
+    """Forest on a sample of ``df``; encoders fit on ``classes`` (column ->
+    labels) where given, else on ``df``."""
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.preprocessing import LabelEncoder
+
+    classes = classes or {}
+    sample = df.sample(min(len(df), MODEL_TRAIN_ROWS), random_state=seed)
+    encoders = {col: LabelEncoder().fit(np.asarray(classes.get(col, df[col]), dtype=object).astype(str))
+                for col in trend.CAT_COLS}
+    X = sample.drop(columns="drugcost").copy()
+    for col in trend.CAT_COLS:
+        X[col] = encoders[col].transform(X[col])
+    model = RandomForestRegressor(n_estimators=50, max_depth=16, random_state=seed).fit(X, sample["drugcost"])
+    return model, encoders
+
+
+def paths(out):
+    return {name: os.path.join(out, name) for name in ("formulary.csv", "formulary.db", "trend.csv", "trend.pkl")}
+
+
+def generate(out, rows, seed=0, trend_rows=None):
+    """Write all synthetic files to ``out`` (skipping ones that exist); returns their paths."""
+    os.makedirs(out, exist_ok=True)
+    p = paths(out)
+    rng = np.random.default_rng(seed)
+    if not os.path.exists(p["formulary.csv"]):
+        tmp = p["formulary.csv"] + ".tmp"
+        for start in range(0, rows, CHUNK_ROWS):
+            chunk = formulary_frame(start, min(CHUNK_ROWS, rows - start), rows, rng)
+            chunk.to_csv(tmp, mode="a" if start else "w", header=not start, index=False)
+        os.replace(tmp, p["formulary.csv"])
+    if not os.path.exists(p["formulary.db"]):
+        loader.load(p["formulary.csv"], p["formulary.db"] + ".tmp")
+        os.replace(p["formulary.db"] + ".tmp", p["formulary.db"])
+    if not os.path.exists(p["trend.csv"]) or not os.path.exists(p["trend.pkl"]):
+        trend_rows = trend_rows or rows
+        trend_rng = np.random.default_rng(seed + 1)
+        base_cost = trend_rng.lognormal(4.0, 0.8, max(1, trend_rows // TREND_ROWS_PER_DRUG))
+        tmp = p["trend.csv"] + ".tmp"
+        first = None
+        for start in range(0, trend_rows, CHUNK_ROWS):
+            chunk = trend_frame(min(CHUNK_ROWS, trend_rows - start), trend_rng, base_cost)
+            chunk.to_csv(tmp, mode="a" if start else "w", header=not start, index=False)
+            first = chunk if first is None else first
+        os.replace(tmp, p["trend.csv"])
+        names = medicine_names(np.arange(len(base_cost)))
+        classes = {"season": SEASONS, "drugname": names, "alternatedrug": names, "YearMonth": YEAR_MONTHS}
+        model, encoders = train_model(first, seed, classes)
+        with open(p["trend.pkl"], "wb") as f:
+            pickle.dump({"model": model, "encoders": encoders}, f)
+    return p
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic PBM datasets.")
+    parser.add_argument("rows", nargs="?", default="10k", help="formulary rows, e.g. 10k, 1m, 10m")
+    parser.add_argument("--trend-rows", default=None, help="trend rows (default: same as rows)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="default: data/cache/bench-<rows>-<seed>")
+    args = parser.parse_args(argv)
+    rows = parse_rows(args.rows)
+    out = args.out or os.path.join("data", "cache", f"bench-{args.rows}-{args.seed}")
+    trend_rows = parse_rows(args.trend_rows) if args.trend_rows else None
+    for name, path in generate(out, rows, args.seed, trend_rows).items():
+        print(f"{name:<14} {os.path.getsize(path):>14,} bytes  {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Rendered-chart cache for the trend analysis views.
+
+Charts are drawn on standalone ``matplotlib.figure.Figure`` objects (never
+registered with pyplot, so nothing accumulates in a long-lived server), saved
+to PNG and kept in a process-wide LRU bounded by total bytes.  Keys are
+(chart type, drug, year, data version); repeat views of popular drugs are
+served from memory without touching matplotlib.
+"""
+import io
+import threading
+from collections import OrderedDict
+
+from pbm import metrics
+
+MAX_BYTES = 64 * 1024 * 1024
+DPI = 200
+
+
+class RenderCache:
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._images)
+
+    def get(self, key, draw, figsize):
+        """PNG bytes for ``key``; on a miss ``draw(fig)`` renders a new figure."""
+        with self._lock:
+            png = self._images.get(key)
+            if png is not None:
+                self._images.move_to_end(key)
+                self.hits += 1
+                metrics.hit("charts.render")
+                return png
+            self.misses += 1
+        metrics.miss("charts.render")
+        with metrics.span("charts.render"):
+            png = render(draw, figsize)
+        with self._lock:
+            if key not in self._images and len(png) <= self.max_bytes:
+                self._images[key] = png
+                self.bytes += len(png)
+                while self.bytes > self.max_bytes:
+                    _, old = self._images.popitem(last=False)
+                    self.bytes -= len(old)
+        return png
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._images),
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def render(draw, figsize):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    try:
+        draw(fig)
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png", dpi=DPI, bbox_inches="tight")
+        return buf.getvalue()
+    finally:
+        fig.clear()
+
+
+def usage_trend(pattern_df, drug, year):
+    def draw(fig):
+        ax = fig.subplots()
+        ax.plot(pattern_df["Month"], pattern_df["no_of_customer_using_drug"], marker='o', color='blue', label='Normal drug user')
+        ax.plot(pattern_df["Month"], pattern_df["no_of_customer_using_alternate_drug"], marker='o', color='red', label='Alternate drug user')
+        ax.set_xlabel("Month")
+        ax.set_ylabel("Number of Users")
+        ax.set_title(f"User Trend for {drug} in {year}")
+        ax.legend()
+        ax.grid(True)
+    return draw
+
+
+def usage_totals(total_drug, total_alt, year):
+    def draw(fig):
+        ax = fig.subplots()
+        ax.bar(["Normal Drug", "Alternate Drug"], [total_drug, total_alt], color=["blue", "red"])
+        ax.set_ylabel("Number of Customers")
+        ax.set_title(f"Customer Usage in {year}")
+    return draw
+
+
+cache = RenderCache()
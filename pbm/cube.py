@@ -0,0 +1,223 @@
+"""Precomputed forecast cube: every drug x 2025-2030 x 12 months.
+
+    python -m pbm.cube [--workers 4] [--force]
+
+The whole grid is built as one feature frame (the same features
+``trend.future_frame`` produces, with seeded perturbations), encoded once and
+predicted in chunks on a process pool.  Workers load the model through
+``models.get_model``, so they share the memory-mapped tree export.  The result
+goes to ``data/cache/forecast-<model>-<data>/``:
+
+* ``drugcost.npy``, ``customers.npy`` - float32 / int32, shape (drugs, years, 12)
+* ``manifest.json``                   - drug names, years, seed, source hashes
+
+The directory is keyed on the model's and the dataset's sha256, so a changed
+model or dataset gets a new cube on the next ``load_cube``.
+
+Only the command line uses the process pool.  ``load_cube``, called from the
+app's threads (warm-up, pages, service), predicts in-process by default:
+forking a pool from a multi-threaded server is unsafe.  Pages pass
+``build_missing=False`` and predict the one drug directly until the cube
+exists.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from pbm import artifacts, datastore, metrics, models, trend
+
+CUBE_VERSION = 1
+YEARS = range(2025, 2031)
+MONTHS = range(1, 13)
+SEED = 2025
+CHUNK_ROWS = 50_000
+
+_cubes = {}
+
+
+def cube_path(model_digest, data_digest):
+    return os.path.join(datastore.CACHE_DIR, f"forecast-{model_digest[:16]}-{data_digest[:16]}")
+
+
+def baselines(df):
+    """``trend.baseline`` for every drug at once, indexed by drug name."""
+    groups = df.groupby("drugname", sort=False)
+    mode = lambda s: s.mode()[0]  # noqa: E731
+    return groups.agg(
+        season=("season", mode),
+        alternatedrug=("alternatedrug", mode),
+        alternatedrugcost=("alternatedrugcost", "mean"),
+        no_of_customer_using_drug=("no_of_customer_using_drug", mode),
+        no_of_customer_using_alternate_drug=("no_of_customer_using_alternate_drug", mode),
+    )
+
+
+def grid_frame(base, years=YEARS, months=MONTHS, seed=SEED, variation=trend.VARIATION):
+    """Raw feature rows for every (drug, year, month), drug-major."""
+    years, months = list(years), list(months)
+    n_drugs, per_drug = len(base), len(years) * len(months)
+    rng = np.random.default_rng(seed)
+    shape = (n_drugs, per_drug)
+
+    def perturbed(col):
+        factor = rng.uniform(1 - variation, 1 + variation, shape)
+        return base[col].to_numpy(dtype=float)[:, None] * factor
+
+    def repeat(col):
+        # categorical, so encoding looks up each distinct value once
+        values = pd.Categorical(base[col].to_numpy())
+        return pd.Categorical.from_codes(np.repeat(values.codes, per_drug), values.categories)
+
+    year = np.tile(np.repeat(years, len(months)), n_drugs)
+    month = np.tile(months, len(years) * n_drugs)
+    return pd.DataFrame({
+        "season": repeat("season"),
+        "drugname": pd.Categorical.from_codes(np.repeat(np.arange(n_drugs), per_drug), base.index),
+        "alternatedrug": repeat("alternatedrug"),
+        "alternatedrugcost": np.round(perturbed("alternatedrugcost"), 2).ravel(),
+        "no_of_customer_using_drug": perturbed("no_of_customer_using_drug").astype(int).ravel(),
+        "no_of_customer_using_alternate_drug": perturbed("no_of_customer_using_alternate_drug").astype(int).ravel(),
+        "Year": year,
+        "Month": month,
+        "YearMonth": pd.Categorical.from_codes(
+            np.tile(np.arange(per_drug), n_drugs), [f"{y}-{m:02d}" for y in years for m in months]),
+    })
+
+
+def _predict_chunk(model_path, frame):
+    return models.get_model(model_path).predictor.predict(frame)
+
+
+def predict(model_path, features, workers=None, chunk_rows=CHUNK_ROWS):
+    """Predict ``features`` in chunks, on a process pool when there are several."""
+    chunks = [features.iloc[i:i + chunk_rows] for i in range(0, len(features), chunk_rows)]
+    if len(chunks) <= 1 or workers == 1:
+        return np.concatenate([_predict_chunk(model_path, c) for c in chunks]) if chunks else np.empty(0)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = pool.map(_predict_chunk, [model_path] * len(chunks), chunks)
+        return np.concatenate(list(parts))
+
+
+def build(model_path=trend.MODEL_PATH, data_path=trend.DATA_PATH, workers=None, seed=SEED, replace=False):
+    """Forecast the full grid and write the cube; returns its directory."""
+    loaded = models.get_model(model_path)
+    data_digest = datastore.file_hash(data_path)
+    target = cube_path(loaded.sha256, data_digest)
+
+    start = time.perf_counter()
+    base = baselines(datastore.load_frame(data_path))
+    raw = grid_frame(base, seed=seed)
+    customers = raw["no_of_customer_using_drug"].to_numpy()
+    features = trend.encode(raw, loaded.encoders)
+    drugcost = predict(model_path, features, workers)
+    shape = (len(base), len(YEARS), len(MONTHS))
+
+    os.makedirs(datastore.CACHE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=datastore.CACHE_DIR, prefix=".build-")
+    np.save(os.path.join(tmp, "drugcost.npy"), drugcost.astype(np.float32).reshape(shape))
+    np.save(os.path.join(tmp, "customers.npy"), customers.astype(np.int32).reshape(shape))
+    manifest = {
+        "version": CUBE_VERSION,
+        "model_sha256": loaded.sha256,
+        "dataset_sha256": data_digest,
+        "drugs": [str(d) for d in base.index],
+        "years": list(YEARS),
+        "months": list(MONTHS),
+        "seed": seed,
+        "build_seconds": round(time.perf_counter() - start, 3),
+    }
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    return artifacts.publish(tmp, target, replace)
+
+
+class ForecastCube:
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.drugcost = np.load(os.path.join(directory, "drugcost.npy"), mmap_mode="r")
+        self.customers = np.load(os.path.join(directory, "customers.npy"), mmap_mode="r")
+        self._drug_ids = {d: i for i, d in enumerate(self.manifest["drugs"])}
+        self._first_year = self.manifest["years"][0]
+
+    def __contains__(self, drug):
+        return drug in self._drug_ids
+
+    def frame(self, drug, year, months):
+        """Forecast rows for ``drug`` in ``year`` and ``months``; None if not in the cube."""
+        i = self._drug_ids.get(drug)
+        y = year - self._first_year
+        if i is None or not 0 <= y < len(self.manifest["years"]):
+            return None
+        m = np.asarray(list(months)) - 1
+        return pd.DataFrame({
+            "Month": m + 1,
+            "no_of_customer_using_drug": self.customers[i, y, m],
+            "drugcost": self.drugcost[i, y, m].astype(float),
+        })
+
+
+def _fresh(manifest, key):
+    if not os.path.exists(manifest):
+        return False
+    with open(manifest) as f:
+        meta = json.load(f)
+    return meta.get("version") == CUBE_VERSION and (meta.get("model_sha256"), meta.get("dataset_sha256")) == key
+
+
+def load_cube(model_path=trend.MODEL_PATH, data_path=trend.DATA_PATH, build_missing=True, workers=1):
+    """The cube for the current model and dataset, building it if needed.
+
+    With ``build_missing=False`` a missing or stale cube raises
+    ``FileNotFoundError`` at once, without waiting for a build in progress.
+    """
+    model_digest = datastore.file_hash(model_path)
+    data_digest = datastore.file_hash(data_path)
+    key = (model_digest, data_digest)
+    cube = _cubes.get(key)
+    if cube is not None:
+        metrics.hit("forecast.cube")
+        return cube
+    metrics.miss("forecast.cube")
+    directory = cube_path(model_digest, data_digest)
+    manifest = os.path.join(directory, "manifest.json")
+    if not build_missing and not _fresh(manifest, key):
+        raise FileNotFoundError(f"No forecast cube for {model_path}; run python -m pbm.cube")
+    with artifacts.build_lock(directory):
+        cube = _cubes.get(key)
+        if cube is not None:
+            return cube
+        if not _fresh(manifest, key):
+            directory = build(model_path, data_path, workers, replace=os.path.exists(manifest))
+        cube = _cubes[key] = ForecastCube(directory)
+    return cube
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the drug x year x month forecast cube.")
+    parser.add_argument("--model", default=trend.MODEL_PATH)
+    parser.add_argument("--data", default=trend.DATA_PATH)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="rebuild even if up to date")
+    args = parser.parse_args(argv)
+
+    if args.force:
+        directory = build(args.model, args.data, args.workers, replace=True)
+    else:
+        directory = load_cube(args.model, args.data, workers=args.workers).directory
+    with open(os.path.join(directory, "manifest.json")) as f:
+        meta = json.load(f)
+    meta["drugs"] = len(meta["drugs"])
+    print(json.dumps(meta, indent=2))
+
+
+if __name__ == "__main__":
+    main()
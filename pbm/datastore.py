@@ -0,0 +1,187 @@
+"""Columnar on-disk cache for the CSV datasets shared by the pages.
+
+Each source CSV is parsed once and written to ``data/cache/<name>-<hash>/`` as
+one ``.npy`` file per column.  Numeric columns are stored as-is, text columns
+as int32 codes plus a UTF-8 category blob, so every column can be memory-mapped
+and only the columns a page asks for are ever touched.
+"""
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from pbm import artifacts, metrics
+
+CACHE_DIR = os.path.join("data", "cache")
+FORMULARY_CSV = "data/full_dataset_with_new_avg_cost_and_score.csv"
+TREND_CSV = "data/synthetic_drug_data_with_year_month.csv"
+
+FORMAT_VERSION = 1
+
+_stores = {}
+
+file_hash = artifacts.file_hash
+
+
+def cache_path(path, digest=None):
+    digest = digest or file_hash(path)
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{stem}-{digest[:16]}")
+
+
+def save_strings(prefix, values):
+    encoded = [v.encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    np.save(prefix + ".offsets.npy", offsets)
+    np.save(prefix + ".blob.npy", np.frombuffer(b"".join(encoded), dtype=np.uint8))
+
+
+def load_strings(prefix):
+    offsets = np.load(prefix + ".offsets.npy")
+    blob = np.load(prefix + ".blob.npy").tobytes()
+    return np.array(
+        [blob[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)],
+        dtype=object,
+    )
+
+
+@metrics.timed("csv.load")
+def build_cache(path, digest=None, replace=False):
+    """Parse ``path`` once and write its columnar cache; returns the cache dir."""
+    digest = digest or file_hash(path)
+    target = cache_path(path, digest)
+    df = pd.read_csv(path)
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=CACHE_DIR, prefix=".build-")
+    columns = []
+    for i, name in enumerate(df.columns):
+        col = df[name]
+        stem = f"c{i}"
+        if pd.api.types.is_numeric_dtype(col) or pd.api.types.is_bool_dtype(col):
+            np.save(os.path.join(tmp, stem + ".npy"), col.to_numpy())
+            kind = "numeric"
+        else:
+            codes, uniques = pd.factorize(col.astype(object), use_na_sentinel=True)
+            np.save(os.path.join(tmp, stem + ".npy"), codes.astype(np.int32))
+            save_strings(os.path.join(tmp, stem), [str(u) for u in uniques])
+            kind = "category"
+        columns.append({"name": str(name), "kind": kind, "file": stem})
+
+    manifest = {
+        "version": FORMAT_VERSION,
+        "source": os.path.basename(path),
+        "sha256": digest,
+        "rows": len(df),
+        "columns": columns,
+    }
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    return artifacts.publish(tmp, target, replace)
+
+
+class ColumnStore:
+    """Read-only view over a columnar cache; columns load on first access."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.sha256 = self.manifest["sha256"]
+        self.rows = self.manifest["rows"]
+        self._meta = {c["name"]: c for c in self.manifest["columns"]}
+        self._cache = {}
+
+    @property
+    def columns(self):
+        return [c["name"] for c in self.manifest["columns"]]
+
+    def __contains__(self, name):
+        return name in self._meta
+
+    def codes(self, name):
+        """Raw column array: values for numeric columns, int32 codes for text."""
+        meta = self._meta[name]
+        # copy-on-write mapping: pages can modify frames without touching the file
+        return np.load(os.path.join(self.directory, meta["file"] + ".npy"), mmap_mode="c")
+
+    def categories(self, name):
+        key = ("categories", name)
+        if key not in self._cache:
+            meta = self._meta[name]
+            self._cache[key] = load_strings(os.path.join(self.directory, meta["file"]))
+        return self._cache[key]
+
+    def column(self, name, categorical=False):
+        meta = self._meta[name]
+        values = self.codes(name)
+        if meta["kind"] == "numeric":
+            return pd.Series(values, name=name, copy=False)
+        categories = self.categories(name)
+        if categorical:
+            cat = pd.Categorical.from_codes(values, categories=pd.Index(categories, dtype=object))
+            return pd.Series(cat, name=name)
+        out = np.empty(len(values), dtype=object)
+        out[:] = np.nan
+        valid = values >= 0
+        out[valid] = categories[values[valid]]
+        return pd.Series(out, name=name, dtype=object)
+
+    def frame(self, columns=None, categorical=False):
+        names = self.columns if columns is None else [c for c in columns if c in self._meta]
+        return pd.DataFrame(
+            {n: self.column(n, categorical=categorical) for n in names}, copy=False
+        )
+
+
+def open_store(path):
+    """Return the ColumnStore for ``path``, building the cache if it is stale."""
+    digest = file_hash(path)
+    store = _stores.get(path)
+    if store is not None and store.sha256 == digest:
+        metrics.hit("datastore.store")
+        return store
+    metrics.miss("datastore.store")
+    directory = cache_path(path, digest)
+    with artifacts.build_lock(directory):
+        store = _stores.get(path)
+        if store is not None and store.sha256 == digest:
+            return store
+        if not os.path.exists(os.path.join(directory, "manifest.json")):
+            directory = build_cache(path, digest)
+        store = ColumnStore(directory)
+        if store.manifest.get("version") != FORMAT_VERSION:
+            store = ColumnStore(build_cache(path, digest, replace=True))
+        _stores[path] = store
+    return store
+
+
+@metrics.timed("datastore.load_frame")
+def load_frame(path, columns=None, categorical=False):
+    """Drop-in replacement for ``pd.read_csv(path, usecols=columns)``."""
+    return open_store(path).frame(columns, categorical=categorical)
+
+
+def prune(path):
+    """Remove cache directories of older versions of ``path``."""
+    if not os.path.isdir(CACHE_DIR):
+        return
+    stem = os.path.splitext(os.path.basename(path))[0]
+    keep = os.path.basename(cache_path(path))
+    for entry in os.listdir(CACHE_DIR):
+        if entry.startswith(stem + "-") and entry != keep:
+            shutil.rmtree(os.path.join(CACHE_DIR, entry), ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import sys
+
+    for p in sys.argv[1:] or [FORMULARY_CSV, TREND_CSV]:
+        store = open_store(p)
+        prune(p)
+        print(f"{p}: {store.rows} rows, {len(store.columns)} columns -> {store.directory}")
@@ -0,0 +1,158 @@
+"""SQLite connection manager for the formulary database.
+
+* WAL journal, so readers never block on the writer and vice versa.
+* A pool of read connections (``with db.reader() as conn``), each with a
+  large prepared-statement cache; connections are reused across threads
+  instead of being opened per rerun.
+* One writer thread owns the only write connection.  Writes are queued and
+  committed in batches: everything waiting in the queue goes into one
+  transaction, each item under its own savepoint so a failing insert does not
+  roll back its neighbours.
+"""
+import atexit
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+from pbm import formulary_db
+
+STATEMENT_CACHE = 512
+BUSY_TIMEOUT = 30
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def _connect(path):
+    conn = sqlite3.connect(
+        path, timeout=BUSY_TIMEOUT, check_same_thread=False,
+        cached_statements=STATEMENT_CACHE, isolation_level=None,
+    )
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class Database:
+    def __init__(self, path=formulary_db.DB_FILE, readers=8, batch_size=256):
+        self.path = path
+        self.batch_size = batch_size
+        self.init_error = None
+        self._pool = queue.LifoQueue()
+        self._slots = threading.Semaphore(readers)
+        self._writes = queue.Queue()
+
+        self._writer = _connect(path)
+        self._writer.execute("PRAGMA journal_mode=WAL")
+        try:
+            formulary_db.ensure_schema(self._writer)
+        except sqlite3.Error as e:
+            self.init_error = e
+        self._thread = threading.Thread(target=self._write_loop, name="pbm-db-writer", daemon=True)
+        self._thread.start()
+
+    @contextmanager
+    def reader(self):
+        """Borrow a read connection from the pool."""
+        self._slots.acquire()
+        try:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                conn = _connect(self.path)
+                conn.execute("PRAGMA query_only=1")
+            try:
+                yield conn
+            finally:
+                self._pool.put(conn)
+        finally:
+            self._slots.release()
+
+    def query(self, sql, params=()):
+        with self.reader() as conn:
+            cursor = conn.execute(sql, params)
+            columns = [d[0] for d in cursor.description or ()]
+            return columns, cursor.fetchall()
+
+    def call(self, fn, *args):
+        """Run ``fn(conn, *args)`` on the writer; returns a Future of its result."""
+        future = Future()
+        self._writes.put((fn, args, future))
+        return future
+
+    def execute(self, sql, params=()):
+        return self.call(lambda conn: conn.execute(sql, params).rowcount)
+
+    def executemany(self, sql, seq):
+        return self.call(lambda conn: conn.executemany(sql, seq).rowcount)
+
+    def _write_loop(self):
+        while True:
+            item = self._writes.get()
+            if item is None:
+                return
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._writes.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._writes.put(None)
+                    break
+                batch.append(item)
+            self._commit(batch)
+
+    def _commit(self, batch):
+        conn = self._writer
+        results = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, args, future in batch:
+                conn.execute("SAVEPOINT item")
+                try:
+                    results.append((future, fn(conn, *args), None))
+                    conn.execute("RELEASE item")
+                except Exception as e:
+                    conn.execute("ROLLBACK TO item")
+                    conn.execute("RELEASE item")
+                    results.append((future, None, e))
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for future, result, error in results:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def close(self):
+        self._writes.put(None)
+        self._thread.join()
+        self._writer.close()
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def get_database(path=formulary_db.DB_FILE):
+    """Process-wide Database for ``path``."""
+    with _databases_lock:
+        db = _databases.get(path)
+        if db is None:
+            db = _databases[path] = Database(path)
+        return db
+
+
+@atexit.register
+def _close_all():
+    for db in list(_databases.values()):
+        db.close()
@@ -0,0 +1,72 @@
+"""Vectorized label encoding with the trained model's classes.
+
+``ColumnEncoder`` wraps one fitted ``LabelEncoder``'s ``classes_`` in a hash
+index, so a whole column is encoded with one ``get_indexer`` call instead of a
+per-value scan of ``classes_``; categorical columns only look up their
+categories.  Values the model never saw follow an explicit
+policy:
+
+* ``"first"`` - class 0, what the trend page has always done (default)
+* ``"error"`` - raise ``ValueError`` naming the unknown values
+* an int      - that code, e.g. ``-1`` to mark them
+"""
+import weakref
+
+import numpy as np
+import pandas as pd
+
+UNKNOWN_FIRST = "first"
+UNKNOWN_ERROR = "error"
+
+_wrapped = weakref.WeakKeyDictionary()
+
+
+class ColumnEncoder:
+    def __init__(self, classes, unknown=UNKNOWN_FIRST):
+        self.classes_ = np.asarray(classes)
+        self.unknown = unknown
+        self._index = pd.Index(self.classes_)
+
+    def encode(self, values):
+        if isinstance(getattr(values, "dtype", None), pd.CategoricalDtype):
+            # encode the few categories, then gather by the column's codes
+            values = pd.Categorical(values)
+            codes = values.codes
+            lookup = self.encode(values.categories)
+            if not (codes < 0).any():
+                return lookup[codes]
+            # NaN cells (code -1) pick the appended last entry; only they go
+            # through the unknown policy
+            return np.append(lookup, self.encode([np.nan]))[codes]
+        codes = self._index.get_indexer(values)
+        missing = codes < 0
+        if missing.any():
+            if self.unknown == UNKNOWN_ERROR:
+                unseen = pd.unique(np.asarray(values, dtype=object)[missing])
+                raise ValueError(f"unknown labels: {list(unseen[:10])}")
+            codes[missing] = 0 if self.unknown == UNKNOWN_FIRST else int(self.unknown)
+        return codes
+
+    transform = encode
+
+    def decode(self, codes):
+        return self.classes_[np.asarray(codes)]
+
+    inverse_transform = decode
+
+
+def column_encoder(encoder, unknown=UNKNOWN_FIRST):
+    """``encoder`` as a ColumnEncoder; fitted LabelEncoders are wrapped once."""
+    if isinstance(encoder, ColumnEncoder) and encoder.unknown == unknown:
+        return encoder
+    wrapped = _wrapped.setdefault(encoder, {})
+    if unknown not in wrapped:
+        wrapped[unknown] = ColumnEncoder(encoder.classes_, unknown)
+    return wrapped[unknown]
+
+
+def encode_frame(df, encoders, columns, unknown=UNKNOWN_FIRST):
+    """Label-encode ``columns`` of ``df`` in place and return it."""
+    for col in columns:
+        df[col] = column_encoder(encoders[col], unknown).encode(df[col])
+    return df
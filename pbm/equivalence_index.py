@@ -0,0 +1,215 @@
+"""Persisted TF-IDF/SVD embedding index for the equivalence search.
+
+The artifact lives in ``data/cache/equivalence-<dataset hash>-<components>/``:
+
+* ``vocabulary.json`` / ``idf.npy``  - the fitted TfidfVectorizer
+* ``components.npy``                 - TruncatedSVD components (k x terms)
+* ``embeddings.npy``                 - reduced matrix (rows x k), float32
+* ``unit.npy``                       - the same rows normalized, for cosine search
+* ``manifest.json``                  - version, dataset sha256, shapes
+
+Build it offline with ``python -m pbm.equivalence_index``; pages load it with
+``load_index`` which memory-maps the embeddings and only rebuilds when the
+dataset hash changes.  Rows added later (``transform`` + ``append``) are
+projected into the fitted space without a refit.  Neighbor queries go through ``EquivalenceIndex.knn``,
+whose backend (exact or approximate) is chosen in ``pbm.ann``; it shares the
+mapped ``unit`` matrix and holds the appended rows in its ``added`` segment.
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from pbm import ann, artifacts, datastore, metrics, neighbors
+
+ARTIFACT_VERSION = 1
+N_COMPONENTS = 200
+N_NEIGHBORS = 6
+
+
+def combined_text(df):
+    """Text the index is fitted on: medicine name, therapeutic class and use."""
+    text = df["Medicine"].astype(str)
+    for col in ("Therapeutic Class", "use"):
+        text = text + " " + (df[col].fillna("NULL").astype(str) if col in df.columns else "")
+    return text
+
+
+def artifact_path(csv_path, n_components=N_COMPONENTS, digest=None):
+    digest = digest or datastore.file_hash(csv_path)
+    return os.path.join(datastore.CACHE_DIR, f"equivalence-{digest[:16]}-{n_components}")
+
+
+def fit(texts, n_components=N_COMPONENTS, random_state=42):
+    """Fit vectorizer and SVD; returns (vectorizer, components, embeddings)."""
+    # scikit-learn is only needed to fit or to transform new text
+    from sklearn.decomposition import TruncatedSVD
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    tfidf = TfidfVectorizer(stop_words="english")
+    tfidf_matrix = tfidf.fit_transform(texts)
+    n_components = min(n_components, max(1, tfidf_matrix.shape[1] - 1))
+    svd = TruncatedSVD(n_components=n_components, random_state=random_state)
+    embeddings = svd.fit_transform(tfidf_matrix)
+    return tfidf, svd.components_.astype(np.float32), embeddings.astype(np.float32)
+
+
+@metrics.timed("index.build")
+def build(csv_path=datastore.FORMULARY_CSV, n_components=N_COMPONENTS, replace=False):
+    """Fit the index on ``csv_path`` and write the artifact; returns its dir."""
+    digest = datastore.file_hash(csv_path)
+    target = artifact_path(csv_path, n_components, digest)
+    store = datastore.open_store(csv_path)
+    df = store.frame([c for c in ("Medicine", "Therapeutic Class", "use") if c in store])
+
+    start = time.perf_counter()
+    tfidf, components, embeddings = fit(combined_text(df), n_components)
+    fit_seconds = time.perf_counter() - start
+
+    os.makedirs(datastore.CACHE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=datastore.CACHE_DIR, prefix=".build-")
+    vocabulary = {term: int(i) for term, i in tfidf.vocabulary_.items()}
+    with open(os.path.join(tmp, "vocabulary.json"), "w") as f:
+        json.dump(vocabulary, f)
+    np.save(os.path.join(tmp, "idf.npy"), tfidf.idf_)
+    np.save(os.path.join(tmp, "components.npy"), components)
+    np.save(os.path.join(tmp, "embeddings.npy"), embeddings)
+    manifest = {
+        "version": ARTIFACT_VERSION,
+        "dataset": os.path.basename(csv_path),
+        "dataset_sha256": digest,
+        "rows": int(embeddings.shape[0]),
+        "terms": len(vocabulary),
+        "n_components": int(components.shape[0]),
+        "fit_seconds": round(fit_seconds, 3),
+    }
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    return artifacts.publish(tmp, target, replace)
+
+
+class EquivalenceIndex:
+    """Loaded artifact: memory-mapped embeddings plus a lazily rebuilt vectorizer."""
+
+    def __init__(self, directory, backend="exact", **backend_params):
+        self.directory = directory
+        self.backend = backend
+        self.backend_params = backend_params
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.embeddings = np.load(os.path.join(directory, "embeddings.npy"), mmap_mode="r")
+        self.components = np.load(os.path.join(directory, "components.npy"), mmap_mode="r")
+        self._vectorizer = None
+        self._knn = None
+        self._unit = None
+
+    def __len__(self):
+        return len(self.embeddings) + (len(self._knn.added) if self._knn is not None else 0)
+
+    @property
+    def dataset_sha256(self):
+        return self.manifest["dataset_sha256"]
+
+    @property
+    def vectorizer(self):
+        if self._vectorizer is None:
+            with open(os.path.join(self.directory, "vocabulary.json")) as f:
+                vocabulary = json.load(f)
+            from sklearn.feature_extraction.text import TfidfVectorizer
+
+            tfidf = TfidfVectorizer(stop_words="english", vocabulary=vocabulary)
+            tfidf.idf_ = np.load(os.path.join(self.directory, "idf.npy"))
+            self._vectorizer = tfidf
+        return self._vectorizer
+
+    @property
+    def unit(self):
+        """Row-normalized embeddings, written next to the artifact on first use
+        and memory-mapped, so worker processes share one copy."""
+        if self._unit is None:
+            path = os.path.join(self.directory, "unit.npy")
+            if not os.path.exists(path):
+                fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".unit-", suffix=".npy")
+                with os.fdopen(fd, "wb") as f:
+                    np.save(f, neighbors.normalize(self.embeddings))
+                os.replace(tmp, path)
+            self._unit = np.load(path, mmap_mode="r")
+        return self._unit
+
+    @property
+    def knn(self):
+        if self._knn is None:
+            self._knn = ann.make_index(
+                self.unit, self.backend, n_neighbors=N_NEIGHBORS, normalized=True, **self.backend_params
+            )
+        return self._knn
+
+    def transform(self, texts):
+        """Project new texts into the stored embedding space."""
+        tfidf_matrix = self.vectorizer.transform(texts)
+        return np.asarray(tfidf_matrix @ self.components.T, dtype=np.float32)
+
+    @property
+    def added(self):
+        """Unit vectors of the appended rows (ids from ``len(self.embeddings)``)."""
+        return self.knn.added
+
+    def unit_rows(self, rows):
+        """Unit vectors of ``rows``, fitted or appended."""
+        rows = np.asarray(rows, dtype=np.int64)
+        fitted = rows < len(self.embeddings)
+        out = np.empty((len(rows), self.embeddings.shape[1]), dtype=np.float32)
+        out[fitted] = self.unit[rows[fitted]]
+        out[~fitted] = self.added[rows[~fitted] - len(self.embeddings)]
+        return out
+
+    def append(self, embeddings):
+        """Add rows (e.g. from ``transform``) in memory; returns their row ids.
+
+        The artifact and its mapped arrays are untouched: the rows go to the
+        neighbor backend's small ``added`` segment and last for the process.
+        """
+        start = len(self)
+        self.knn.add(neighbors.normalize(embeddings), normalized=True)
+        return np.arange(start, len(self))
+
+
+def load_index(csv_path=datastore.FORMULARY_CSV, n_components=N_COMPONENTS, build_missing=True,
+               backend="exact", **backend_params):
+    """Load the artifact matching the current dataset, building it if needed."""
+    digest = datastore.file_hash(csv_path)
+    directory = artifact_path(csv_path, n_components, digest)
+    manifest = os.path.join(directory, "manifest.json")
+    with artifacts.build_lock(directory):
+        stale = os.path.exists(manifest)
+        if stale:
+            with open(manifest) as f:
+                meta = json.load(f)
+            if meta.get("version") == ARTIFACT_VERSION and meta.get("dataset_sha256") == digest:
+                return EquivalenceIndex(directory, backend, **backend_params)
+        if not build_missing:
+            raise FileNotFoundError(f"No equivalence index for {csv_path}; run python -m pbm.equivalence_index")
+        return EquivalenceIndex(build(csv_path, n_components, replace=stale), backend, **backend_params)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the equivalence search index artifact.")
+    parser.add_argument("--csv", default=datastore.FORMULARY_CSV)
+    parser.add_argument("--components", type=int, default=N_COMPONENTS)
+    parser.add_argument("--force", action="store_true", help="rebuild even if up to date")
+    args = parser.parse_args(argv)
+
+    if args.force:
+        directory = build(args.csv, args.components, replace=True)
+    else:
+        directory = load_index(args.csv, args.components).directory
+    with open(os.path.join(directory, "manifest.json")) as f:
+        print(json.dumps(json.load(f), indent=2))
+
+
+if __name__ == "__main__":
+    main()
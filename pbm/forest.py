@@ -0,0 +1,137 @@
+"""Array-based inference for the exported trend forest.
+
+``CompiledForest`` walks every tree for every row at once over the flat node
+arrays from ``models.ForestArrays``: one vectorized step per tree level instead
+of sklearn's per-call validation, dtype checks and per-tree dispatch.  Inputs
+are compared as float32 and tree outputs are summed in tree order, exactly as
+sklearn does, so predictions are identical.
+
+    python -m pbm.forest [model.pkl]    # check and benchmark against sklearn
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from pbm import metrics, trend
+
+PER_TREE_ROWS = 1024
+
+
+class CompiledForest:
+    def __init__(self, arrays, feature_names=()):
+        self.arrays = arrays
+        self.feature_names = list(feature_names)
+        self._children = None
+
+    def _matrix(self, X):
+        if isinstance(X, pd.DataFrame):
+            if self.feature_names:
+                X = X[self.feature_names]
+            X = X.to_numpy()
+        return np.ascontiguousarray(X, dtype=np.float32)
+
+    def _prepare(self):
+        # plain ndarray views of the exported arrays: indexing the memmap
+        # subclass is slower, and a view keeps the pages shared
+        if self._children is None:
+            a = self.arrays
+            self._children = np.asarray(a.children)
+            self._internal = np.asarray(a.internal)
+            self._feature = np.asarray(a.feature, dtype=np.int64)
+            self._threshold = np.asarray(a.threshold)
+            self._missing_left = np.asarray(a.missing_left)
+        return self._children, self._internal, self._feature, self._threshold
+
+    def _walk(self, flat, n_features, node, rows):
+        children, internal, feature, threshold = self._prepare()
+        has_nan = bool(np.isnan(flat).any())
+        base = rows * n_features
+        active = np.flatnonzero(internal[node])
+        while len(active):
+            cur = node[active]
+            x = flat[base[active] + feature[cur]]
+            go_right = x > threshold[cur]
+            if has_nan:
+                nan = np.isnan(x)
+                go_right[nan] = ~self._missing_left[cur[nan]]
+            nxt = children[2 * cur + go_right]
+            node[active] = nxt
+            keep = internal[nxt]
+            if not keep.all():
+                active = active[keep]
+        return node
+
+    def leaves(self, X):
+        """Leaf node id of every (tree, row), shape ``(n_trees, n_rows)``.
+
+        Small batches walk all trees at once (few numpy calls); large ones go
+        tree by tree, which keeps each level's working set in cache.
+        """
+        X = self._matrix(X)
+        n, n_features = X.shape
+        flat = X.ravel()
+        roots = np.asarray(self.arrays.roots)
+        if n >= PER_TREE_ROWS:
+            rows = np.arange(n)
+            return np.stack([self._walk(flat, n_features, np.full(n, r), rows) for r in roots])
+        node = np.repeat(roots, n)
+        rows = np.tile(np.arange(n), len(roots))
+        return self._walk(flat, n_features, node, rows).reshape(len(roots), n)
+
+    @metrics.timed("model.predict")
+    def predict(self, X):
+        values = self.arrays.value[self.leaves(X)]
+        out = np.zeros(values.shape[1])
+        for tree_values in values:
+            out += tree_values
+        return out / len(values)
+
+
+def compile_model(model):
+    from pbm.models import ForestArrays
+    return CompiledForest(ForestArrays.from_model(model), getattr(model, "feature_names_in_", ()))
+
+
+def _time(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat
+
+
+def benchmark(model, compiled, X, sizes=(1, 12, 1000), repeat=50):
+    """Per-call seconds of sklearn vs compiled predict for each batch size."""
+    rows = []
+    for size in sizes:
+        batch = X.iloc[np.arange(size) % len(X)] if isinstance(X, pd.DataFrame) else X[np.arange(size) % len(X)]
+        expected, got = model.predict(batch), compiled.predict(batch)
+        reps = max(1, repeat // max(1, size // 100))
+        rows.append({
+            "rows": size,
+            "sklearn_ms": _time(lambda: model.predict(batch), reps) * 1e3,
+            "compiled_ms": _time(lambda: compiled.predict(batch), reps) * 1e3,
+            "identical": bool(np.array_equal(expected, got)),
+        })
+    return rows
+
+
+def main(argv=None):
+    from pbm import models
+    parser = argparse.ArgumentParser(description="Compare compiled forest inference with sklearn.")
+    parser.add_argument("model", nargs="?", default=trend.MODEL_PATH)
+    parser.add_argument("--data", default=trend.DATA_PATH, help="rows to predict, encoded like the page")
+    args = parser.parse_args(argv)
+
+    loaded = models.get_model(args.model)
+    model, compiled = loaded.model, loaded.predictor
+    names = list(getattr(model, "feature_names_in_", []))
+    X = trend.encode(pd.read_csv(args.data)[names].copy(), loaded.encoders)
+    for r in benchmark(model, compiled, X):
+        print(f"{r['rows']:>6} rows  sklearn {r['sklearn_ms']:8.3f} ms  "
+              f"compiled {r['compiled_ms']:8.3f} ms  identical={r['identical']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""Schema of and queries against the ``formulary`` table in ``data/formulary.db``.
+
+Besides the raw costs each row stores its cheapest option, savings % and
+effective cost, kept current by insert/update triggers, so a lookup is a
+single index probe.
+"""
+import sqlite3
+
+from pbm import metrics
+
+DB_FILE = "data/formulary.db"
+
+COLUMNS = [
+    ("id", "TEXT"),
+    ("Medicine", "TEXT NOT NULL"),
+    ("Drug_Cost", "REAL"),
+    *[(f"Alternative_{i}", "TEXT") for i in range(1, 6)],
+    *[(f"Cost{i}", "REAL") for i in range(1, 6)],
+    ("Insurance_Drug", "TEXT"),
+    ("Insurance_Drug_FinalCost", "REAL"),
+]
+
+
+# Derived from the columns above by the triggers below; never written directly.
+DERIVED_COLUMNS = [
+    ("Cheapest_Option", "TEXT"),
+    ("Cheapest_Cost", "REAL"),
+    ("Saving_Pct", "REAL"),
+    ("Effective_Cost", "REAL"),
+]
+
+# cheapest non-null, non-zero cost; falls back to Drug_Cost
+_CHEAPEST = (
+    "COALESCE((SELECT min(c) FROM (SELECT Drug_Cost AS c UNION ALL SELECT Cost1 UNION ALL "
+    "SELECT Cost2 UNION ALL SELECT Cost3 UNION ALL SELECT Cost4 UNION ALL SELECT Cost5) "
+    "WHERE c IS NOT NULL AND c != 0), Drug_Cost)"
+)
+
+
+def refresh_sql(where="1"):
+    """Statements recomputing the derived columns for the rows matching ``where``."""
+    option = " ".join(
+        f"WHEN Cost{i} = Cheapest_Cost THEN COALESCE(NULLIF(Alternative_{i}, ''), 'Alternative_{i}')"
+        for i in range(1, 6)
+    )
+    return [
+        f"UPDATE formulary SET Cheapest_Cost = {_CHEAPEST} WHERE {where}",
+        "UPDATE formulary SET "
+        "Cheapest_Option = CASE WHEN Cheapest_Cost IS NULL OR Drug_Cost = Cheapest_Cost THEN Medicine "
+        f"{option} ELSE 'Original' END, "
+        "Saving_Pct = CASE WHEN Drug_Cost IS NULL OR Drug_Cost = 0 THEN 0 "
+        "ELSE round((Drug_Cost - Cheapest_Cost) * 100.0 / Drug_Cost, 2) END, "
+        "Effective_Cost = CASE WHEN NULLIF(Insurance_Drug_FinalCost, 0) IS NULL THEN Cheapest_Cost "
+        "WHEN Cheapest_Cost IS NULL THEN Insurance_Drug_FinalCost "
+        "ELSE min(Cheapest_Cost, Insurance_Drug_FinalCost) END "
+        f"WHERE {where}",
+    ]
+
+
+def _trigger_sql():
+    body = ";\n    ".join(refresh_sql("rowid = NEW.rowid"))
+    sources = ", ".join(f'"{name}"' for name, _ in COLUMNS if name != "id")
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS formulary_derived_insert AFTER INSERT ON formulary\n"
+        f"BEGIN\n    {body};\nEND",
+        f"CREATE TRIGGER IF NOT EXISTS formulary_derived_update AFTER UPDATE OF {sources} ON formulary\n"
+        f"BEGIN\n    {body};\nEND",
+    ]
+
+
+def ensure_schema(conn):
+    """Add missing derived columns, their triggers and the Medicine index.
+
+    Raises sqlite3.OperationalError when the formulary table does not exist.
+    """
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(formulary)")}
+    if not existing:
+        raise sqlite3.OperationalError("no such table: formulary")
+    added = [name for name, _ in DERIVED_COLUMNS if name not in existing]
+    for name, decl in DERIVED_COLUMNS:
+        if name in added:
+            conn.execute(f'ALTER TABLE formulary ADD COLUMN "{name}" {decl}')
+    for sql in _trigger_sql():
+        conn.execute(sql)
+    if added:
+        for sql in refresh_sql():
+            conn.execute(sql)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_medicine ON formulary(Medicine)")
+
+
+def create_table_sql(table="formulary"):
+    cols = ",\n    ".join(f'"{name}" {decl}' for name, decl in COLUMNS + DERIVED_COLUMNS)
+    return f"CREATE TABLE IF NOT EXISTS {table} (\n    {cols}\n)"
+
+
+def drop_duplicates(conn, table="formulary"):
+    """Delete all but the first row (lowest rowid) of each duplicated Medicine,
+    like a full load; returns the duplicated names."""
+    names = [row[0] for row in conn.execute(
+        f"SELECT Medicine FROM {table} WHERE Medicine IS NOT NULL GROUP BY Medicine HAVING COUNT(*) > 1")]
+    if names:
+        conn.execute(
+            f"DELETE FROM {table} WHERE Medicine IS NOT NULL AND rowid NOT IN "
+            f"(SELECT MIN(rowid) FROM {table} WHERE Medicine IS NOT NULL GROUP BY Medicine)")
+    return names
+
+
+def create_indexes(conn, table="formulary"):
+    """Unique index on Medicine: the lookup key and the upsert conflict target.
+
+    Raises sqlite3.IntegrityError naming the duplicates if Medicine is not
+    unique yet (see ``drop_duplicates``).
+    """
+    indexes = {row[1]: row[2] for row in conn.execute(f"PRAGMA index_list({table})")}
+    if indexes.get("idx_medicine") == 1:
+        return
+    duplicates = [row[0] for row in conn.execute(
+        f"SELECT Medicine FROM {table} WHERE Medicine IS NOT NULL GROUP BY Medicine HAVING COUNT(*) > 1 LIMIT 11")]
+    if duplicates:
+        shown = ", ".join(repr(d) for d in duplicates[:10]) + (", ..." if len(duplicates) > 10 else "")
+        raise sqlite3.IntegrityError(f"{table}.Medicine is not unique: {shown}")
+    conn.execute("DROP INDEX IF EXISTS idx_medicine")
+    conn.execute(f"CREATE UNIQUE INDEX idx_medicine ON {table}(Medicine)")
+
+
+def missing(medicine_name):
+    return {
+        "Exists": False,
+        "Medicine": medicine_name,
+        "Drug_Cost": None,
+        "Cheapest_Option": medicine_name,
+        "Cheapest_Cost": None,
+        "Saving_vs_Original_%": 0,
+        "Insurance_Drug": None,
+        "Insurance_Drug_FinalCost": None,
+        "Effective_Cost": None
+    }
+
+
+INFO_SQL = (
+    "SELECT Medicine, Drug_Cost, Cheapest_Option, Cheapest_Cost, Saving_Pct, "
+    "Insurance_Drug, Insurance_Drug_FinalCost, Effective_Cost FROM formulary"
+)
+BATCH_SIZE = 500
+
+
+def _info(row):
+    medicine, drug_cost, option, cheapest, saving, ins_drug, ins_cost, effective = row
+    return {
+        "Exists": True,
+        "Medicine": medicine,
+        "Drug_Cost": drug_cost,
+        "Cheapest_Option": option,
+        "Cheapest_Cost": cheapest,
+        "Saving_vs_Original_%": saving,
+        "Insurance_Drug": ins_drug,
+        "Insurance_Drug_FinalCost": ins_cost,
+        "Effective_Cost": effective
+    }
+
+
+@metrics.timed("sqlite.lookup")
+def get_drug_info(conn, medicine_name):
+    row = conn.execute(INFO_SQL + " WHERE Medicine = ?", (medicine_name,)).fetchone()
+    if row is None:
+        return missing(medicine_name)
+    return _info(row)
+
+
+@metrics.timed("sqlite.lookup_batch")
+def get_drug_info_batch(conn, medicine_names):
+    """get_drug_info for many names with one indexed IN query per 500 names."""
+    names = list(medicine_names)
+    found = {}
+    unique = list(dict.fromkeys(names))
+    for start in range(0, len(unique), BATCH_SIZE):
+        chunk = unique[start:start + BATCH_SIZE]
+        sql = INFO_SQL + f" WHERE Medicine IN ({', '.join('?' * len(chunk))})"
+        for row in conn.execute(sql, chunk):
+            found.setdefault(row[0], _info(row))
+    return [found.get(name) or missing(name) for name in names]
+
+
+def insert_drug(conn, record):
+    """Insert ``record`` unless the medicine already exists; True if inserted."""
+    exists = conn.execute("SELECT 1 FROM formulary WHERE Medicine = ?", (record["Medicine"],)).fetchone()
+    if exists:
+        return False
+    columns_sql = ", ".join([f'"{col}"' for col in record.keys()])
+    placeholders = ", ".join(["?"] * len(record))
+    conn.execute(f"INSERT INTO formulary ({columns_sql}) VALUES ({placeholders})", list(record.values()))
+    return True
+
+
+def rows_after(conn, rowid, columns):
+    """(rowid, *columns) of the rows inserted after ``rowid``, oldest first."""
+    cols = ", ".join(f'"{c}"' for c in columns)
+    return conn.execute(f"SELECT rowid, {cols} FROM formulary WHERE rowid > ? ORDER BY rowid", (rowid,)).fetchall()
+
+
+def rows_by_id(conn, rowids, columns):
+    """(rowid, *columns) for ``rowids``, one IN query per 500 ids."""
+    cols = ", ".join(f'"{c}"' for c in columns)
+    ids = list(rowids)
+    out = []
+    for start in range(0, len(ids), BATCH_SIZE):
+        chunk = ids[start:start + BATCH_SIZE]
+        sql = f"SELECT rowid, {cols} FROM formulary WHERE rowid IN ({', '.join('?' * len(chunk))}) ORDER BY rowid"
+        out += conn.execute(sql, chunk).fetchall()
+    return out
@@ -0,0 +1,182 @@
+"""Compact, indexed in-memory formulary frame.
+
+``load`` reads the columnar cache with text columns as categoricals (int32
+codes over one copy of each distinct string) and stores every price column as
+float64 with NaN for missing cells instead of "NULL" strings.  Prices stay
+float64: the derived cheapest-alternative columns are float64, and comparing
+or summing them against narrowed prices would show rounding noise as savings.
+
+The compacted frame is written once per dataset version to
+``data/cache/compact-<name>-<hash>/`` (one ``.npy`` per column; categoricals
+as their codes plus the category strings) and opened copy-on-write
+memory-mapped (like ``datastore`` columns), so every worker process on a host
+reads the same pages instead of holding its own copy.  Pages therefore keep
+loaded frames with ``st.cache_resource``; ``st.cache_data`` would copy them
+on every rerun.
+
+``RowIndex`` maps medicine names to row positions through the category hash
+table and a CSR layout of the codes: selecting ``k`` names costs O(k) plus
+the matching rows, instead of an ``isin`` scan over the whole frame.
+"""
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+import pandas as pd
+
+from pbm import alternatives, artifacts, datastore
+
+FRAME_VERSION = 2
+PRICE_COLUMNS = ["Drug_Cost", *alternatives.COST_COLUMNS, "Insurance_Saving_%", "Insurance_Drug_FinalCost"]
+DERIVED_COLUMNS = ["cheapest_alt", "cheapest_cost", "base_cost", "savings"]
+
+_categories = {}
+_lock = threading.Lock()
+
+
+def prices(col):
+    """float64 prices with NaN for anything that is not a number."""
+    if isinstance(col.dtype, pd.CategoricalDtype):
+        # parse each distinct string once, then gather by code
+        parsed = alternatives.parse_costs(col.cat.categories.astype(object), missing=np.nan)
+        codes = col.cat.codes.to_numpy()
+        out = np.full(len(codes), np.nan)
+        valid = codes >= 0
+        out[valid] = parsed[codes[valid]]
+        return out
+    return alternatives.parse_costs(col, missing=np.nan)
+
+
+def compact(df):
+    """Narrow ``df`` in place: numeric prices, categorical names; adds the
+    cheapest-alternative columns."""
+    for col in PRICE_COLUMNS:
+        if col in df.columns:
+            df[col] = prices(df[col])
+    alternatives.annotate(df)
+    df["cheapest_alt"] = pd.Categorical(df["cheapest_alt"])
+    for col in df.columns:
+        if df[col].dtype == object or pd.api.types.is_string_dtype(df[col].dtype):
+            df[col] = df[col].astype("category")
+    return df
+
+
+def frame_path(csv_path, digest=None):
+    digest = digest or datastore.file_hash(csv_path)
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(datastore.CACHE_DIR, f"compact-{stem}-{digest[:16]}")
+
+
+def build(csv_path=datastore.FORMULARY_CSV, digest=None, replace=False):
+    """Compact the whole dataset and write it to ``frame_path``; returns the dir."""
+    digest = digest or datastore.file_hash(csv_path)
+    target = frame_path(csv_path, digest)
+    df = compact(datastore.load_frame(csv_path, categorical=True))
+
+    os.makedirs(datastore.CACHE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=datastore.CACHE_DIR, prefix=".build-")
+    columns = []
+    for i, name in enumerate(df.columns):
+        col = df[name]
+        stem = f"c{i}"
+        if isinstance(col.dtype, pd.CategoricalDtype):
+            # codes keep pandas' own dtype so reading them back is zero-copy
+            np.save(os.path.join(tmp, stem + ".npy"), col.array.codes)
+            datastore.save_strings(os.path.join(tmp, stem), [str(c) for c in col.cat.categories])
+            kind = "category"
+        else:
+            np.save(os.path.join(tmp, stem + ".npy"), col.to_numpy())
+            kind = "numeric"
+        columns.append({"name": str(name), "kind": kind, "file": stem})
+    manifest = {
+        "version": FRAME_VERSION,
+        "source": os.path.basename(csv_path),
+        "sha256": digest,
+        "rows": len(df),
+        "columns": columns,
+    }
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+
+    return artifacts.publish(tmp, target, replace)
+
+
+def _category_index(directory, stem):
+    # decoded once per process and shared by every frame opened on it
+    key = (directory, stem)
+    with _lock:
+        if key not in _categories:
+            _categories[key] = pd.Index(datastore.load_strings(os.path.join(directory, stem)), dtype=object)
+        return _categories[key]
+
+
+def read(directory, columns=None):
+    """Frame over the mapped files of a compact-frame directory."""
+    with open(os.path.join(directory, "manifest.json")) as f:
+        manifest = json.load(f)
+    data = {}
+    for meta in manifest["columns"]:
+        name = meta["name"]
+        if columns is not None and name not in columns and name not in DERIVED_COLUMNS:
+            continue
+        values = np.load(os.path.join(directory, meta["file"] + ".npy"), mmap_mode="c")
+        if meta["kind"] == "category":
+            cat = pd.Categorical.from_codes(values, categories=_category_index(directory, meta["file"]),
+                                            validate=False)
+            data[name] = pd.Series(cat, name=name, copy=False)
+        else:
+            data[name] = pd.Series(values, name=name, copy=False)
+    return pd.DataFrame(data, copy=False)
+
+
+def load(csv_path=datastore.FORMULARY_CSV, columns=None):
+    """Compact frame of ``csv_path``: ``columns`` (default all) plus the
+    derived cheapest-alternative columns, built on first use."""
+    digest = datastore.file_hash(csv_path)
+    directory = frame_path(csv_path, digest)
+    manifest = os.path.join(directory, "manifest.json")
+    with artifacts.build_lock(directory):
+        if os.path.exists(manifest):
+            with open(manifest) as f:
+                meta = json.load(f)
+            if meta.get("version") != FRAME_VERSION or meta.get("sha256") != digest:
+                build(csv_path, digest, replace=True)
+        else:
+            build(csv_path, digest)
+    return read(directory, columns)
+
+
+class RowIndex:
+    """Hash index from a column's values to the row positions holding them."""
+
+    def __init__(self, values):
+        cat = pd.Categorical(values)
+        codes = cat.codes
+        self.keys = cat.categories
+        self.order = np.argsort(codes, kind="stable").astype(np.int64)
+        # rows of key i are order[offsets[i]:offsets[i + 1]]; NaN (-1) sorts first
+        self.offsets = np.searchsorted(codes[self.order], np.arange(len(self.keys) + 1))
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, name):
+        return name in self.keys
+
+    def names(self):
+        return self.keys.tolist()
+
+    def positions(self, names):
+        """Sorted row positions of every row whose value is one of ``names``."""
+        ids = self.keys.get_indexer(pd.Index(list(names), dtype=object).unique())
+        ids = ids[ids >= 0]
+        if not len(ids):
+            return np.zeros(0, dtype=np.int64)
+        parts = [self.order[self.offsets[i]:self.offsets[i + 1]] for i in ids]
+        return np.sort(np.concatenate(parts))
+
+    def take(self, df, names):
+        """``df[df[column].isin(names)]`` for the column this index was built on."""
+        return df.iloc[self.positions(names)]
@@ -0,0 +1,154 @@
+"""Stream the master formulary CSV into ``data/formulary.db``.
+
+    python -m pbm.loader                       # full rebuild
+    python -m pbm.loader --upsert new.csv      # insert or update by Medicine
+
+A full load writes into a staging table chunk by chunk (``executemany`` inside
+large transactions, no indexes), then swaps it in, builds the indexes and fills
+the derived columns in one set-based pass, so readers keep seeing the old table
+until the new one is complete.  An upsert writes into the live table, whose
+triggers keep the derived columns of the touched rows current; duplicate
+Medicine rows already in it are reduced to the first one before the unique
+index is built.  Memory is bounded by ``--chunksize`` rows.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from pbm import datastore, formulary_db
+from pbm.alternatives import parse_costs
+
+log = logging.getLogger("pbm.loader")
+
+CHUNKSIZE = 50_000
+ROWS_PER_TRANSACTION = 500_000
+
+TEXT_SOURCES = {"Medicine": "Medicine", "Insurance_Drug": "Insurance_Drug",
+                **{f"Alternative_{i}": f"Alternative {i}" for i in range(1, 6)}}
+COST_SOURCES = {"Drug_Cost": "Drug_Cost", "Insurance_Drug_FinalCost": "Insurance_Drug_FinalCost",
+                **{f"Cost{i}": f"Cost {i}" for i in range(1, 6)}}
+
+
+def _text(col):
+    s = col.astype(object)
+    s = s.where(s.notna(), None)
+    return [None if v is None or str(v).strip().upper() in ("", "NULL") else str(v).strip() for v in s]
+
+
+def to_rows(chunk, first_id=0):
+    """Convert one CSV chunk to tuples in ``formulary_db.COLUMNS`` order."""
+    n = len(chunk)
+    columns = {}
+    if "id" in chunk.columns:
+        columns["id"] = _text(chunk["id"])
+    else:
+        columns["id"] = [str(i) for i in range(first_id, first_id + n)]
+    for name, source in TEXT_SOURCES.items():
+        columns[name] = _text(chunk[source]) if source in chunk.columns else [None] * n
+    for name, source in COST_SOURCES.items():
+        if source in chunk.columns:
+            costs = parse_costs(chunk[source])
+            columns[name] = [None if not np.isfinite(c) else float(c) for c in costs]
+        else:
+            columns[name] = [None] * n
+    return list(zip(*(columns[name] for name, _ in formulary_db.COLUMNS)))
+
+
+def _insert_sql(table, upsert):
+    names = [name for name, _ in formulary_db.COLUMNS]
+    cols = ", ".join(f'"{n}"' for n in names)
+    sql = f"INSERT INTO {table} ({cols}) VALUES ({', '.join('?' * len(names))})"
+    if upsert:
+        updates = ", ".join(f'"{n}" = excluded."{n}"' for n in names if n != "Medicine")
+        sql += f" ON CONFLICT(Medicine) DO UPDATE SET {updates}"
+    return sql
+
+
+def load(csv_path=datastore.FORMULARY_CSV, db_file=formulary_db.DB_FILE, upsert=False,
+         chunksize=CHUNKSIZE, rows_per_transaction=ROWS_PER_TRANSACTION, progress=None):
+    """Load ``csv_path`` into ``db_file``; returns (rows, seconds)."""
+    conn = sqlite3.connect(db_file, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA cache_size=-262144")
+
+    table = "formulary" if upsert else "formulary_staging"
+    if upsert:
+        conn.execute("BEGIN")
+        conn.execute(formulary_db.create_table_sql(table))
+        formulary_db.ensure_schema(conn)
+        duplicates = formulary_db.drop_duplicates(conn, table)
+        formulary_db.create_indexes(conn, table)
+        conn.execute("COMMIT")
+        if duplicates:
+            log.warning("kept the first row of %d duplicated medicines in %s: %s%s", len(duplicates), db_file,
+                        ", ".join(duplicates[:10]), ", ..." if len(duplicates) > 10 else "")
+    else:
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(formulary_db.create_table_sql(table))
+    sql = _insert_sql(table, upsert)
+    # a full load keeps the first row of duplicate names, like the pages do
+    seen = set()
+
+    start = time.perf_counter()
+    total = pending = 0
+    conn.execute("BEGIN")
+    for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+        rows = [r for r in to_rows(chunk, total) if r[1] is not None]
+        if not upsert:
+            rows = [r for r in rows if r[1] not in seen and not seen.add(r[1])]
+        conn.executemany(sql, rows)
+        total += len(chunk)
+        pending += len(chunk)
+        if pending >= rows_per_transaction:
+            conn.execute("COMMIT")
+            conn.execute("BEGIN")
+            pending = 0
+        if progress:
+            progress(total, time.perf_counter() - start)
+    conn.execute("COMMIT")
+
+    if not upsert:
+        conn.execute("BEGIN")
+        conn.execute("DROP TABLE IF EXISTS formulary")
+        conn.execute(f"ALTER TABLE {table} RENAME TO formulary")
+        formulary_db.create_indexes(conn)
+        conn.execute("COMMIT")
+        # the staging table had no triggers: one set-based pass fills the
+        # derived columns, then ensure_schema adds the triggers
+        conn.execute("BEGIN")
+        for sql in formulary_db.refresh_sql():
+            conn.execute(sql)
+        formulary_db.ensure_schema(conn)
+        conn.execute("COMMIT")
+    conn.execute("ANALYZE formulary")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.close()
+    return total, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk load the formulary CSV into SQLite.")
+    parser.add_argument("csv", nargs="?", default=datastore.FORMULARY_CSV)
+    parser.add_argument("--db", default=formulary_db.DB_FILE)
+    parser.add_argument("--upsert", action="store_true", help="insert or update rows by Medicine")
+    parser.add_argument("--chunksize", type=int, default=CHUNKSIZE)
+    args = parser.parse_args(argv)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+
+    def progress(rows, seconds):
+        print(f"\r{rows:,} rows  {rows / max(seconds, 1e-9):,.0f} rows/s", end="", flush=True)
+
+    rows, seconds = load(args.csv, args.db, args.upsert, args.chunksize, progress=progress)
+    print(f"\nloaded {rows:,} rows into {args.db} in {seconds:.2f}s ({rows / max(seconds, 1e-9):,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
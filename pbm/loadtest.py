@@ -0,0 +1,109 @@
+"""Closed-loop load generator for ``pbm.service``.
+
+    python -m pbm.loadtest --url http://127.0.0.1:8765 \\
+        --get "/lookup?medicine=Azithral 500 Tablet" \\
+        --post /recommend/batch '{"medicines": ["Azithral 500 Tablet"]}' \\
+        --concurrency 32 --requests 5000
+
+Each of ``--concurrency`` workers keeps one keep-alive connection and sends
+the given requests round-robin.  Prints a JSON report with requests/second
+and p50/p90/p99/max latency in milliseconds.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+from urllib.parse import quote, urlsplit
+
+import numpy as np
+
+
+async def _request(reader, writer, host, method, path, body):
+    head = (
+        f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+        f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + body)
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("server closed the connection")
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        key, _, value = line.decode("latin-1").partition(":")
+        if key.strip().lower() == "content-length":
+            length = int(value)
+    await reader.readexactly(length)
+    return int(status_line.split()[1])
+
+
+async def _worker(url, requests, counter, total, latencies, errors):
+    parts = urlsplit(url)
+    reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+    try:
+        for method, path, body in requests:
+            if next(counter) >= total:
+                break
+            start = time.perf_counter()
+            try:
+                status = await _request(reader, writer, parts.netloc, method, path, body)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                errors.append("connection")
+                writer.close()
+                reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+                continue
+            latencies.append(time.perf_counter() - start)
+            if status >= 400:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run(url, requests, concurrency=16, total=1000):
+    """Send ``total`` requests from ``concurrency`` connections; returns the report."""
+    counter = itertools.count()
+    latencies, errors = [], []
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        _worker(url, itertools.cycle(requests[i % len(requests):] + requests[:i % len(requests)]),
+                counter, total, latencies, errors)
+        for i in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+    ms = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p90_ms": round(float(np.percentile(ms, 90)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load test a running pbm.service instance.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--get", action="append", default=[], metavar="PATH")
+    parser.add_argument("--post", action="append", nargs=2, default=[], metavar=("PATH", "JSON"))
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    requests = [("GET", quote(p, safe="/?=&,"), b"") for p in args.get]
+    requests += [("POST", p, body.encode()) for p, body in args.post]
+    if not requests:
+        requests = [("GET", "/health", b"")]
+    report = asyncio.run(run(args.url, requests, args.concurrency, args.requests))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
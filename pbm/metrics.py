@@ -0,0 +1,239 @@
+"""Per-process timing histograms and cache counters.
+
+    from pbm import metrics
+
+    @metrics.timed("sqlite.lookup")
+    def get_drug_info(...): ...
+
+    with metrics.span("knn.query"):
+        ...
+
+    metrics.hit("datastore.store")      # or metrics.miss(...), metrics.count(...)
+
+Latencies go into log-spaced histograms (4 buckets per decade from 1 us to
+1000 s) with count, sum, min and max; ``snapshot()`` adds estimated
+percentiles, the counters and the process's peak RSS, and ``export_json()``
+serialises it for the diagnostics page or a scrape.
+
+Recording is on unless ``PBM_METRICS=0``; ``disable()`` turns it off at run
+time.  When off, ``timed`` wrappers cost one flag check and ``span`` returns a
+shared no-op context manager.
+"""
+import functools
+import json
+import math
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+try:
+    import resource
+except ImportError:  # not on Windows
+    resource = None
+
+BUCKETS_PER_DECADE = 4
+MIN_SECONDS = 1e-6
+N_BUCKETS = 9 * BUCKETS_PER_DECADE + 2  # 1 us .. 1000 s, plus under/overflow
+
+_enabled = os.environ.get("PBM_METRICS", "1") != "0"
+_histograms = {}
+_counters = {}
+_lock = threading.Lock()
+_noop = nullcontext()
+
+
+def enabled():
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+
+def _bucket(seconds):
+    if seconds < MIN_SECONDS:
+        return 0
+    return min(N_BUCKETS - 1, 1 + int(math.log10(seconds / MIN_SECONDS) * BUCKETS_PER_DECADE))
+
+
+def _upper(bucket):
+    return MIN_SECONDS * 10 ** (bucket / BUCKETS_PER_DECADE)
+
+
+class Histogram:
+    __slots__ = ("buckets", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.buckets = [0] * N_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.buckets[_bucket(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q):
+        """Upper edge of the bucket holding the ``q``-th percentile, capped at max."""
+        if not self.count:
+            return 0.0
+        rank = q / 100 * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            seen += n
+            if n and seen >= rank:
+                return min(_upper(i), self.max)
+        return self.max
+
+    def summary(self):
+        ms = lambda s: round(s * 1e3, 4)  # noqa: E731
+        return {
+            "count": self.count,
+            "total_ms": ms(self.total),
+            "mean_ms": ms(self.total / self.count) if self.count else 0.0,
+            "min_ms": ms(self.min) if self.count else 0.0,
+            "p50_ms": ms(self.percentile(50)),
+            "p90_ms": ms(self.percentile(90)),
+            "p99_ms": ms(self.percentile(99)),
+            "max_ms": ms(self.max),
+        }
+
+
+def observe(name, seconds):
+    """Record one ``seconds`` long call of ``name``."""
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = Histogram()
+        hist.add(seconds)
+
+
+def count(name, n=1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def hit(name):
+    count(name + ".hit")
+
+
+def miss(name):
+    count(name + ".miss")
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+def span(name):
+    """Context manager timing its block as ``name``."""
+    return _Span(name) if _enabled else _noop
+
+
+def timed(name):
+    """Decorator timing every call of the function as ``name``."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if os.uname().sysname == "Darwin" else 1024
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20, 1)
+
+
+def memory_mb():
+    """Current RSS split into shared and private pages (Linux only, else None).
+
+    Memory-mapped artifacts read by several workers show up as shared; PSS
+    charges each shared page to the processes mapping it in equal parts.
+    """
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = dict(line.split(":", 1) for line in f.read().splitlines()[1:])
+    except OSError:
+        return None
+
+    def mb(*names):
+        return round(sum(int(fields[n].split()[0]) for n in names if n in fields) / 1024, 1)
+
+    return {
+        "rss": mb("Rss"),
+        "pss": mb("Pss"),
+        "shared": mb("Shared_Clean", "Shared_Dirty"),
+        "private": mb("Private_Clean", "Private_Dirty"),
+    }
+
+
+def snapshot():
+    with _lock:
+        timings = {name: h.summary() for name, h in sorted(_histograms.items())}
+        counters = dict(sorted(_counters.items()))
+    caches = {}
+    for name in counters:
+        if name.endswith(".hit") or name.endswith(".miss"):
+            base = name.rsplit(".", 1)[0]
+            hits, misses = counters.get(base + ".hit", 0), counters.get(base + ".miss", 0)
+            caches[base] = {"hits": hits, "misses": misses,
+                            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0}
+    return {
+        "pid": os.getpid(),
+        "enabled": _enabled,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "peak_rss_mb": peak_rss_mb(),
+        "memory_mb": memory_mb(),
+        "timings": timings,
+        "counters": counters,
+        "caches": caches,
+    }
+
+
+def export_json(path=None):
+    """The snapshot as JSON; also written to ``path`` if given."""
+    text = json.dumps(snapshot(), indent=2)
+    if path:
+        with open(path, "w") as f:
+            f.write(text)
+    return text
@@ -0,0 +1,220 @@
+"""Process-wide registry for the pickled trend model.
+
+``get_model(path)`` returns a ``LoadedModel`` that is created once per model
+version (sha256 of the pickle) and process; later calls only ``stat`` the
+file.  The first load also exports the forest to
+``data/cache/models/<name>-<sha>/``:
+
+* ``feature/threshold/left/right/value/missing_left.npy`` - all trees' nodes
+* ``children/internal.npy`` - the walk's packed child ids and branch mask
+* ``roots.npy``             - first node of every tree
+* ``classes-<column>.npy`` - label-encoder classes
+* ``manifest.json``        - sha256, version, feature names
+
+Those arrays are memory-mapped, and stored in the dtypes inference uses, so
+every worker process on a host shares the same pages instead of holding its
+own unpickled or converted copy of the trees.  Only batches of at least
+``SKLEARN_MIN_ROWS`` rows (large Monte Carlo runs, see ``batch_predictor``)
+unpickle the sklearn model, once per process, because its compiled traversal
+is several times faster there.
+"""
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from pbm import artifacts, datastore, encoding, forest, metrics, trend
+
+MODEL_DIR = os.path.join(datastore.CACHE_DIR, "models")
+EXPORT_VERSION = 3
+SKLEARN_MIN_ROWS = 24_000
+
+
+class ForestArrays:
+    """Flat node arrays of a fitted tree ensemble (regressor, one output)."""
+
+    FIELDS = ("feature", "threshold", "left", "right", "value", "missing_left", "roots", "children", "internal")
+
+    def __init__(self, feature, threshold, left, right, value, missing_left, roots, children=None, internal=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.missing_left = missing_left
+        self.roots = roots
+        # left child at 2i, right at 2i+1, and which nodes branch
+        self.children = np.stack([left, right], axis=1).ravel() if children is None else children
+        self.internal = np.asarray(left) >= 0 if internal is None else internal
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_model(cls, model):
+        trees = [est.tree_ for est in model.estimators_]
+        sizes = [t.node_count for t in trees]
+        offsets = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int64)
+        left, right = [], []
+        for t, off in zip(trees, offsets):
+            # children are tree-local ids (-1 for leaves); make them global
+            left.append(np.where(t.children_left >= 0, t.children_left + off, -1))
+            right.append(np.where(t.children_right >= 0, t.children_right + off, -1))
+        return cls(
+            np.concatenate([t.feature for t in trees]).astype(np.int64),
+            np.concatenate([t.threshold for t in trees]).astype(np.float64),
+            np.concatenate(left).astype(np.int64),
+            np.concatenate(right).astype(np.int64),
+            np.concatenate([t.value[:, 0, 0] for t in trees]).astype(np.float64),
+            # where NaN inputs go; sklearn < 1.3 trees have no missing-value support
+            np.concatenate([getattr(t, "missing_go_to_left", np.zeros(t.node_count))
+                            for t in trees]).astype(bool),
+            offsets,
+        )
+
+    def save(self, directory):
+        for name in self.FIELDS:
+            np.save(os.path.join(directory, name + ".npy"), getattr(self, name))
+
+    @classmethod
+    def load(cls, directory):
+        return cls(*[np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+                     for name in cls.FIELDS])
+
+
+def export_path(path, digest):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(MODEL_DIR, f"{stem}-{digest[:16]}")
+
+
+def export(path, digest, model, encoders, replace=False):
+    """Write the memory-mappable export of ``model``; returns its directory."""
+    target = export_path(path, digest)
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=MODEL_DIR, prefix=".build-")
+    has_trees = hasattr(model, "estimators_") and hasattr(model.estimators_[0], "tree_")
+    if has_trees:
+        ForestArrays.from_model(model).save(tmp)
+    for col, le in encoders.items():
+        classes = np.asarray(le.classes_)
+        if classes.dtype == object:
+            classes = classes.astype(str)
+        np.save(os.path.join(tmp, f"classes-{col}.npy"), classes)
+    manifest = {
+        "version": EXPORT_VERSION,
+        "source": os.path.basename(path),
+        "sha256": digest,
+        "model": type(model).__name__,
+        "has_trees": bool(has_trees),
+        "n_trees": len(model.estimators_) if has_trees else 0,
+        "feature_names": [str(f) for f in getattr(model, "feature_names_in_", [])],
+        "encoders": sorted(encoders),
+    }
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return artifacts.publish(tmp, target, replace)
+
+
+class LoadedModel:
+    """One model version: encoders and tree arrays from the export, the
+    sklearn estimator unpickled only if something asks for it."""
+
+    def __init__(self, path, directory, model=None):
+        self.path = path
+        self.directory = directory
+        with open(os.path.join(directory, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.sha256 = self.manifest["sha256"]
+        self._model = model
+        self._arrays = None
+        self._predictor = None
+        self._lock = threading.Lock()
+        self.encoders = {}
+        for col in self.manifest["encoders"]:
+            classes = np.load(os.path.join(directory, f"classes-{col}.npy"))
+            self.encoders[col] = encoding.ColumnEncoder(classes)
+
+    @property
+    def version(self):
+        return self.sha256[:12]
+
+    @property
+    def feature_names(self):
+        return self.manifest["feature_names"]
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                self._model, _ = trend.load_model(self.path)
+            return self._model
+
+    @property
+    def arrays(self):
+        """Memory-mapped ForestArrays, or None if the model is not a tree ensemble."""
+        if self._arrays is None and self.manifest["has_trees"]:
+            self._arrays = ForestArrays.load(self.directory)
+        return self._arrays
+
+    @property
+    def predictor(self):
+        """Compiled forest over the memory-mapped arrays; the sklearn model
+        if the export holds no trees."""
+        if self.arrays is None:
+            return self.model
+        if self._predictor is None:
+            self._predictor = forest.CompiledForest(self.arrays, self.feature_names)
+        return self._predictor
+
+    def batch_predictor(self, rows):
+        """``predictor`` for batches under ``SKLEARN_MIN_ROWS`` rows, else the
+        sklearn model, unpickled once per process and kept."""
+        return self.model if rows >= SKLEARN_MIN_ROWS else self.predictor
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.hits = 0
+
+    def get(self, path=trend.MODEL_PATH):
+        digest = datastore.file_hash(path)
+        key = (os.path.abspath(path), digest)
+        with self._lock:
+            loaded = self._models.get(key)
+            if loaded is not None:
+                self.hits += 1
+                metrics.hit("models.registry")
+                return loaded
+            metrics.miss("models.registry")
+            loaded = self._load(path, digest)
+            # drop older versions of the same file
+            for old in [k for k in self._models if k[0] == key[0]]:
+                del self._models[old]
+            self._models[key] = loaded
+            self.loads += 1
+            return loaded
+
+    def _load(self, path, digest):
+        directory = export_path(path, digest)
+        manifest = os.path.join(directory, "manifest.json")
+        stale = os.path.exists(manifest)
+        if stale:
+            with open(manifest) as f:
+                meta = json.load(f)
+            if meta.get("version") == EXPORT_VERSION and meta.get("sha256") == digest:
+                return LoadedModel(path, directory)
+        model, encoders = trend.load_model(path)
+        return LoadedModel(path, export(path, digest, model, encoders, replace=stale), model)
+
+
+registry = ModelRegistry()
+
+
+def get_model(path=trend.MODEL_PATH):
+    return registry.get(path)
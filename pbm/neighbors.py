@@ -0,0 +1,261 @@
+"""Precomputed top-k neighbor table for the equivalence recommendations.
+
+For every medicine the table stores its k nearest rows (cosine over the SVD
+embeddings, self included, like ``NearestNeighbors.kneighbors``) as int32
+indices and float32 distances, plus each neighbor's cheapest alternative and
+its cost.  Serving a recommendation is then a row lookup.
+
+The table is written next to the equivalence index artifact it was computed
+from (``<index dir>/topk-<k>/``) and memory-mapped.  Rows appended later are
+folded in by ``patch``, which keeps their neighbors, and those of older rows a
+new row displaced, in a small in-memory overlay; the mapped arrays are never
+copied.
+"""
+import json
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from pbm import artifacts, metrics
+
+TOP_K = 6
+CHUNK_SIZE = 2048
+
+
+def normalize(embeddings):
+    x = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return x / norms
+
+
+def compute_topk(embeddings, k=TOP_K, chunk_size=CHUNK_SIZE, workers=None, rows=None, index=None):
+    """Cosine top-k for ``rows`` (default: all) in chunked matrix products.
+
+    NumPy releases the GIL inside the matmul, so chunks run in parallel on a
+    thread pool without copying the embedding matrix into worker processes.
+    With ``index`` (a ``pbm.ann`` backend) chunks are answered by its
+    ``kneighbors`` instead of the exact product.
+    """
+    unit = normalize(embeddings)
+    queries = unit if rows is None else unit[np.asarray(rows)]
+    n = len(queries)
+    k = min(k, len(unit))
+    indices = np.empty((n, k), dtype=np.int32)
+    distances = np.empty((n, k), dtype=np.float32)
+    workers = workers or min(8, os.cpu_count() or 1)
+
+    def run(start):
+        stop = min(start + chunk_size, n)
+        if index is not None:
+            dist, idx = index.kneighbors(queries[start:stop], n_neighbors=k)
+            indices[start:stop], distances[start:stop] = idx, dist
+            return
+        sims = queries[start:stop] @ unit.T
+        part = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        part_sims = np.take_along_axis(sims, part, axis=1)
+        order = np.argsort(-part_sims, axis=1, kind="stable")
+        indices[start:stop] = np.take_along_axis(part, order, axis=1)
+        distances[start:stop] = 1.0 - np.take_along_axis(part_sims, order, axis=1)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(run, range(0, n, chunk_size)))
+    return indices, distances
+
+
+class NeighborTable:
+    """Top-k neighbors per row with each neighbor's cheapest alternative attached."""
+
+    def __init__(self, indices, distances, alt_codes, alt_costs, alt_names, directory=None):
+        self.indices = indices
+        self.distances = distances
+        self.alt_codes = alt_codes
+        self.alt_costs = alt_costs
+        self.alt_names = alt_names
+        self.directory = directory
+        # row -> (indices, distances, alt_codes, alt_costs) overriding the arrays
+        self.patched = {}
+        self.n_rows = len(indices)
+        self._alt_ids = None
+
+    def __len__(self):
+        return self.n_rows
+
+    @property
+    def k(self):
+        return self.indices.shape[1]
+
+    def _row(self, row):
+        if row in self.patched:
+            return self.patched[row]
+        return self.indices[row], self.distances[row], self.alt_codes[row], self.alt_costs[row]
+
+    def lookup(self, row):
+        """Neighbors of ``row`` as (indices, distances, alternatives, costs)."""
+        indices, distances, codes, costs = self._row(row)
+        alts = [self.alt_names[c] if c >= 0 else None for c in codes]
+        return indices, distances, alts, costs
+
+    def neighbor_rows(self, rows):
+        """Neighbor indices for a batch of rows, as one (len(rows), k) array."""
+        rows = np.asarray(rows, dtype=np.int64)
+        stored = rows < len(self.indices)
+        out = np.empty((len(rows), self.k), dtype=np.int32)
+        out[stored] = self.indices[rows[stored]]
+        if self.patched:
+            for i in (~stored | np.isin(rows, list(self.patched))).nonzero()[0]:
+                out[i] = self.patched[int(rows[i])][0]
+        return out
+
+    def attach(self, cheapest_alt, cheapest_cost):
+        """(Re)compute the cheapest-alternative columns from per-row arrays."""
+        codes, names = pd.factorize(pd.Series(cheapest_alt, dtype=object), use_na_sentinel=True)
+        self.alt_codes = codes.astype(np.int32)[self.indices]
+        self.alt_costs = np.asarray(cheapest_cost, dtype=np.float32)[self.indices]
+        self.alt_names = [str(n) for n in names]
+        self._alt_ids = None
+
+    def _alt_code(self, name):
+        if name is None or name != name:
+            return -1
+        if self._alt_ids is None:
+            self._alt_ids = {n: i for i, n in enumerate(self.alt_names)}
+        name = str(name)
+        if name not in self._alt_ids:
+            self._alt_ids[name] = len(self.alt_names)
+            self.alt_names.append(name)
+        return self._alt_ids[name]
+
+    def patch(self, unit, added, cheapest_alt, cheapest_cost, chunk_size=CHUNK_SIZE):
+        """Fold the rows appended since the last call into the table.
+
+        ``unit`` holds the unit vectors of the rows the table was built on and
+        ``added`` those of every appended row, newest last (see
+        ``EquivalenceIndex.added``).  The new rows get their exact top-k over
+        both; an existing row only changes if a new row is closer than its
+        k-th neighbor, found with one (rows x new rows) product.  Results go
+        to ``patched``; returns the rows whose neighbors changed.
+        """
+        n_fitted, k = len(unit), self.k
+        first = self.n_rows
+        new = np.asarray(added[first - n_fitted:], dtype=np.float32)
+        if not len(new):
+            return np.zeros(0, dtype=np.int64)
+        new_rows = np.arange(first, first + len(new))
+        patched_rows = np.fromiter(self.patched, dtype=np.int64, count=len(self.patched))
+        changed = {}
+
+        # existing rows: merge the new rows in where they beat the k-th neighbor
+        for segment, offset in ((unit, 0), (added[:first - n_fitted], n_fitted)):
+            for start in range(0, len(segment), chunk_size):
+                block = np.arange(offset + start, offset + min(start + chunk_size, len(segment)))
+                cand_dist = (1.0 - segment[start:start + chunk_size] @ new.T).astype(np.float32)
+                worst = np.empty(len(block), dtype=np.float32)
+                stored = block < len(self.indices)
+                worst[stored] = self.distances[block[stored], -1]
+                for i in (~stored | np.isin(block, patched_rows)).nonzero()[0]:
+                    worst[i] = self.patched[int(block[i])][1][-1]
+                for i in (cand_dist < worst[:, None]).any(axis=1).nonzero()[0]:
+                    indices, distances = self._row(int(block[i]))[:2]
+                    all_idx = np.concatenate([indices, new_rows])
+                    all_dist = np.concatenate([distances, cand_dist[i]])
+                    order = np.argsort(all_dist, kind="stable")[:k]
+                    changed[int(block[i])] = (all_idx[order], all_dist[order])
+
+        # new rows: exact top-k over the fitted and all appended rows
+        for start in range(0, len(new), chunk_size):
+            q = new[start:start + chunk_size]
+            sims = np.hstack([q @ unit.T, q @ np.asarray(added).T])
+            kk = min(k, sims.shape[1])
+            part = np.argpartition(-sims, kk - 1, axis=1)[:, :kk]
+            part_sims = np.take_along_axis(sims, part, axis=1)
+            order = np.argsort(-part_sims, axis=1, kind="stable")
+            for j in range(len(q)):
+                changed[first + start + j] = (part[j, order[j]], 1.0 - part_sims[j, order[j]])
+
+        for row, (indices, distances) in changed.items():
+            indices = indices.astype(np.int32)
+            codes = np.array([self._alt_code(a) for a in cheapest_alt[indices]], dtype=np.int32)
+            self.patched[row] = (indices, distances.astype(np.float32), codes,
+                                 np.asarray(cheapest_cost[indices], dtype=np.float32))
+        self.n_rows = first + len(new)
+        return np.array(sorted(changed), dtype=np.int64)
+
+    def save(self, directory):
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp = tempfile.mkdtemp(dir=parent, prefix=".build-")
+        np.save(os.path.join(tmp, "indices.npy"), np.asarray(self.indices, dtype=np.int32))
+        np.save(os.path.join(tmp, "distances.npy"), np.asarray(self.distances, dtype=np.float32))
+        np.save(os.path.join(tmp, "alt_codes.npy"), np.asarray(self.alt_codes, dtype=np.int32))
+        np.save(os.path.join(tmp, "alt_costs.npy"), np.asarray(self.alt_costs, dtype=np.float32))
+        with open(os.path.join(tmp, "alt_names.json"), "w") as f:
+            json.dump(self.alt_names, f)
+        artifacts.publish(tmp, directory, replace=True)
+        self.directory = directory
+        return directory
+
+    @classmethod
+    def load(cls, directory):
+        def arr(name):
+            return np.load(os.path.join(directory, name), mmap_mode="r")
+
+        with open(os.path.join(directory, "alt_names.json")) as f:
+            alt_names = json.load(f)
+        return cls(arr("indices.npy"), arr("distances.npy"), arr("alt_codes.npy"),
+                   arr("alt_costs.npy"), alt_names, directory)
+
+    @classmethod
+    @metrics.timed("knn.table_build")
+    def build(cls, embeddings, cheapest_alt, cheapest_cost, k=TOP_K, **kwargs):
+        indices, distances = compute_topk(embeddings, k=k, **kwargs)
+        table = cls(indices, distances, None, None, None)
+        table.attach(cheapest_alt, cheapest_cost)
+        return table
+
+
+def table_path(index_dir, k=TOP_K):
+    return os.path.join(index_dir, f"topk-{k}")
+
+
+def load_table(index, cheapest_alt, cheapest_cost, k=TOP_K):
+    """Load the table for an EquivalenceIndex, computing it on first use.
+
+    The exact backend is computed with the chunked product; any other
+    backend configured on ``index`` answers the queries itself.
+    """
+    directory = table_path(index.directory, k)
+    with artifacts.build_lock(directory):
+        if not os.path.exists(os.path.join(directory, "indices.npy")):
+            searcher = index.knn if index.backend != "exact" else None
+            table = NeighborTable.build(index.embeddings, cheapest_alt, cheapest_cost, k=k, index=searcher)
+            table.save(directory)
+    return NeighborTable.load(directory)
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from pbm import alternatives, datastore, equivalence_index
+
+    parser = argparse.ArgumentParser(description="Precompute the top-k equivalence neighbor table.")
+    parser.add_argument("--csv", default=datastore.FORMULARY_CSV)
+    parser.add_argument("-k", type=int, default=TOP_K)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--backend", default="exact", help="exact or ivf")
+    parser.add_argument("--n-probe", type=int, default=8, help="ivf cells scanned per query")
+    args = parser.parse_args()
+
+    params = {"n_probe": args.n_probe} if args.backend == "ivf" else {}
+    index = equivalence_index.load_index(args.csv, backend=args.backend, **params)
+    cheapest = alternatives.cheapest_alternatives(datastore.load_frame(args.csv))
+    start = time.perf_counter()
+    table = NeighborTable.build(index.embeddings, cheapest.alternative, cheapest.cost,
+                                k=args.k, workers=args.workers,
+                                index=index.knn if args.backend != "exact" else None)
+    directory = table.save(table_path(index.directory, args.k))
+    print(f"{len(table)} rows x {table.k} neighbors in {time.perf_counter() - start:.2f}s -> {directory}")
@@ -0,0 +1,239 @@
+"""Cheapest-alternative recommendations, independent of Streamlit.
+
+A ``Recommender`` bundles the annotated formulary frame with the equivalence
+index and (optionally) the precomputed neighbor table.  ``recommend`` answers
+one medicine, ``recommend_many`` streams records for a list of names and
+resolves their neighbors in batches.
+
+Medicines inserted into the SQLite formulary after the index was fitted are
+folded in by ``sync``: their text is projected into the fitted TF-IDF/SVD
+space, appended to the neighbor backend and the neighbor table is patched,
+so they are recommendable without a refit.  Inserted rows live in small
+in-memory segments next to the mapped frame, index and table, so an insert
+costs memory for the new rows only.
+"""
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from pbm import alternatives, datastore, equivalence_index, formulary_db, formulary_frame, metrics, neighbors
+
+SYNC_INTERVAL = 1.0
+# SQLite column -> formulary CSV column
+DB_COLUMNS = {
+    "Medicine": "Medicine",
+    "Drug_Cost": "Drug_Cost",
+    **{f"Alternative_{i}": f"Alternative {i}" for i in range(1, alternatives.N_ALTERNATIVES + 1)},
+    **{f"Cost{i}": f"Cost {i}" for i in range(1, alternatives.N_ALTERNATIVES + 1)},
+}
+
+
+def load_frame(csv_path=datastore.FORMULARY_CSV):
+    """Compact formulary frame with the derived columns the recommender needs."""
+    return formulary_frame.load(csv_path)
+
+
+class _Column:
+    """A per-row array plus the rows appended to it in memory."""
+
+    def __init__(self, values):
+        self.base = values
+        self.added = values[:0].copy()
+
+    def __len__(self):
+        return len(self.base) + len(self.added)
+
+    def __getitem__(self, rows):
+        n = len(self.base)
+        if np.ndim(rows) == 0:
+            return self.base[rows] if rows < n else self.added[rows - n]
+        rows = np.asarray(rows, dtype=np.int64)
+        out = np.empty(len(rows), dtype=self.base.dtype)
+        fitted = rows < n
+        out[fitted] = self.base[rows[fitted]]
+        out[~fitted] = self.added[rows[~fitted] - n]
+        return out
+
+    def append(self, values):
+        self.added = np.concatenate([self.added, np.asarray(values, dtype=self.base.dtype)])
+
+
+class Recommender:
+    def __init__(self, df, index, table=None):
+        self.index = index
+        self.table = table
+        self.medicines = _Column(df["Medicine"].to_numpy())
+        self.cheapest_alt = _Column(df["cheapest_alt"].to_numpy())
+        self.cheapest_cost = _Column(df["cheapest_cost"].to_numpy())
+        self.has_cost = "Drug_Cost" in df.columns
+        self.base_cost = _Column(df["base_cost"].to_numpy())
+        # first row wins for duplicate names, like matches.index[0]
+        lower = df["Medicine"].astype(object).fillna("NULL").astype(str).str.lower().to_numpy()
+        self.rows = {}
+        for i in range(len(lower) - 1, -1, -1):
+            self.rows[lower[i]] = i
+        self.synced_rowid = 0
+        self._synced_at = -np.inf
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, csv_path=datastore.FORMULARY_CSV, df=None, use_table=True, **index_params):
+        df = load_frame(csv_path) if df is None else df
+        index = equivalence_index.load_index(csv_path, **index_params)
+        table = None
+        if use_table:
+            table = neighbors.load_table(index, df["cheapest_alt"].to_numpy(), df["cheapest_cost"].to_numpy())
+        return cls(df, index, table)
+
+    def find(self, name):
+        return self.rows.get(str(name).strip().lower())
+
+    @metrics.timed("index.add")
+    def add(self, df):
+        """Make the rows of ``df`` (formulary CSV columns) recommendable without
+        a refit; names already known are skipped.  Returns the new row ids."""
+        with self._lock:
+            names = df["Medicine"].astype(str).str.strip().to_numpy(dtype=object)
+            lower = [n.lower() for n in names]
+            keep = np.array([n not in self.rows for n in lower], dtype=bool)
+            keep &= ~pd.Series(lower).duplicated().to_numpy()
+            if not keep.any():
+                return np.zeros(0, dtype=np.int64)
+            df = df[keep].assign(Medicine=names[keep])
+            cheapest = alternatives.cheapest_alternatives(df)
+            embeddings = self.index.transform(equivalence_index.combined_text(df))
+
+            # columns grow first: until the table is patched to the same length,
+            # ``neighbors`` answers from the backend, whose ids stay in range
+            self.medicines.append(df["Medicine"].to_numpy(dtype=object))
+            self.cheapest_alt.append(cheapest.alternative)
+            self.cheapest_cost.append(cheapest.cost)
+            self.base_cost.append(cheapest.base_cost)
+            rows = self.index.append(embeddings)
+            if self.table is not None:
+                self.table.patch(self.index.unit, self.index.added, self.cheapest_alt, self.cheapest_cost)
+            for i, name in zip(rows, np.asarray(lower, dtype=object)[keep]):
+                self.rows[name] = int(i)
+            return rows
+
+    def sync(self, database, interval=SYNC_INTERVAL):
+        """Fold medicines inserted into the SQLite formulary since the last call
+        into the index; at most once per ``interval`` seconds.  Returns the new
+        row ids."""
+        now = time.monotonic()
+        if now - self._synced_at < interval:
+            return np.zeros(0, dtype=np.int64)
+        self._synced_at = now
+        try:
+            with database.reader() as conn:
+                latest = formulary_db.rows_after(conn, self.synced_rowid, ["Medicine"])
+                # the first call sees every row; fetch details only for unknown names
+                unknown = [rowid for rowid, name in latest if self.find(name) is None]
+                records = formulary_db.rows_by_id(conn, unknown, list(DB_COLUMNS))
+        except sqlite3.Error:
+            return np.zeros(0, dtype=np.int64)
+        if latest:
+            self.synced_rowid = latest[-1][0]
+        if not records:
+            return np.zeros(0, dtype=np.int64)
+        df = pd.DataFrame([r[1:] for r in records], columns=list(DB_COLUMNS.values()))
+        return self.add(df)
+
+    def neighbors(self, rows):
+        """Neighbor rows for a batch of rows: table lookup or one kneighbors call."""
+        rows = np.asarray(rows, dtype=np.int64)
+        with metrics.span("knn.query"):
+            if self.table is not None and len(self.table) == len(self.medicines):
+                metrics.hit("knn.table")
+                return self.table.neighbor_rows(rows)
+            metrics.miss("knn.table")
+            _, idx = self.index.knn.kneighbors(self.index.unit_rows(rows))
+            return idx
+
+    def _line(self, i):
+        return {
+            "alt": self.cheapest_alt[i],
+            "cost": self.cheapest_cost[i],
+            "from_med": self.medicines[i],
+            "from_cost": self.base_cost[i] if self.has_cost else "NA",
+        }
+
+    def recommend_row(self, idx, neighbor_rows):
+        """Top line for ``idx``: its own cheapest alternative, else the
+        cheapest alternative among its neighbors.  None if there is none."""
+        if np.isfinite(self.cheapest_cost[idx]):
+            return self._line(idx)
+        best = None
+        for i in neighbor_rows:
+            if i == idx or not np.isfinite(self.cheapest_cost[i]):
+                continue
+            if best is None or self.cheapest_cost[i] < self.cheapest_cost[best]:
+                best = i
+        return None if best is None else self._line(best)
+
+    def record(self, name, idx=None, neighbor_rows=()):
+        """Flat, serialisable recommendation record for ``name``."""
+        out = {
+            "medicine": name,
+            "status": "not_found",
+            "drug_name": None,
+            "original_cost": None,
+            "alternative": None,
+            "alternative_cost": None,
+            "savings": None,
+        }
+        if idx is None:
+            return out
+        line = self.recommend_row(idx, neighbor_rows)
+        if line is None:
+            out["status"] = "no_alternative"
+            return out
+        from_cost = line["from_cost"] if line["from_cost"] != "NA" else None
+        savings = None
+        if from_cost is not None and np.isfinite(from_cost):
+            savings = round(float(from_cost) - float(line["cost"]), 2)
+        out.update(
+            status="ok",
+            drug_name=line["from_med"],
+            original_cost=_number(from_cost),
+            alternative=line["alt"],
+            alternative_cost=_number(line["cost"]),
+            savings=savings,
+        )
+        return out
+
+    def recommend(self, name):
+        idx = self.find(name)
+        if idx is None:
+            return self.record(name)
+        return self.record(name, idx, self.neighbors([idx])[0])
+
+    def recommend_many(self, names=None, batch_size=1024):
+        """Yield one record per name; ``names=None`` covers the whole formulary."""
+        if names is None:
+            names = [self.medicines[i] for i in sorted(self.rows.values())]
+        batch = []
+        for name in names:
+            batch.append(name)
+            if len(batch) >= batch_size:
+                yield from self._recommend_batch(batch)
+                batch = []
+        if batch:
+            yield from self._recommend_batch(batch)
+
+    def _recommend_batch(self, names):
+        found = [self.find(n) for n in names]
+        rows = [i for i in found if i is not None]
+        nbrs = dict(zip(rows, self.neighbors(rows))) if rows else {}
+        for name, idx in zip(names, found):
+            yield self.record(name, idx, nbrs.get(idx, ()))
+
+
+def _number(x):
+    if x is None:
+        return None
+    x = float(x)
+    return x if np.isfinite(x) else None
@@ -0,0 +1,219 @@
+"""Pre-aggregated rollups of the trend dataset for the analysis views.
+
+* usage    - (drug, year, month) -> customers using the drug / its alternate
+* seasonal - (season, year, drug) -> total customers, drug cost sum and count
+
+Both are stored under ``data/cache/rollups-<dataset>/`` as ``.npy`` columns
+(keys as int codes into the name lists in ``manifest.json``) and loaded into
+frames with a sorted MultiIndex, so a view is an index lookup whose cost does
+not depend on how much raw history there is.
+
+When the CSV only grew (its old bytes are unchanged), ``refresh`` reads just
+the appended rows and adds their aggregates to the stored ones; any other
+change rebuilds from scratch.
+
+    python -m pbm.rollups [csv]
+"""
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from pbm import artifacts, datastore, trend
+
+ROLLUP_VERSION = 1
+
+USAGE_KEYS = ["drugname", "Year", "Month"]
+USAGE_VALUES = ["no_of_customer_using_drug", "no_of_customer_using_alternate_drug"]
+SEASONAL_KEYS = ["season", "Year", "drugname"]
+SEASONAL_VALUES = ["total_customers", "cost_sum", "cost_count"]
+
+_loaded = {}
+
+
+def rollup_path(path):
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(datastore.CACHE_DIR, f"rollups-{stem}")
+
+
+def _prefix_hash(path, size):
+    h = hashlib.sha256()
+    remaining = size
+    with open(path, "rb") as f:
+        while remaining:
+            block = f.read(min(1 << 20, remaining))
+            if not block:
+                break
+            h.update(block)
+            remaining -= len(block)
+    return h.hexdigest()
+
+
+def aggregate(df):
+    """Usage and seasonal rollups of raw trend rows."""
+    usage = df.groupby(USAGE_KEYS)[USAGE_VALUES].sum()
+    seasonal = df.groupby(SEASONAL_KEYS).agg(
+        total_customers=("no_of_customer_using_drug", "sum"),
+        cost_sum=("drugcost", "sum"),
+        cost_count=("drugcost", "count"),
+    )
+    return usage, seasonal
+
+
+def merge(old, new):
+    """Add the aggregates in ``new`` to ``old`` (same index levels)."""
+    if old is None or old.empty:
+        return new.sort_index()
+    return old.add(new, fill_value=0).astype(old.dtypes.to_dict()).sort_index()
+
+
+class Rollups:
+    def __init__(self, usage, seasonal):
+        self.usage_table = usage.sort_index()
+        self.seasonal_table = seasonal.sort_index()
+
+    def usage(self, drug, year):
+        """Monthly customer counts of ``drug`` in ``year``, sorted by month."""
+        try:
+            rows = self.usage_table.loc[(drug, year)]
+        except KeyError:
+            return pd.DataFrame(columns=["Month"] + USAGE_VALUES)
+        return rows.reset_index()
+
+    def seasonal(self, season, years):
+        """Per-drug total customers and mean cost in ``season`` over ``years``,
+        most used first."""
+        parts = []
+        for year in years:
+            try:
+                parts.append(self.seasonal_table.loc[(season, year)])
+            except KeyError:
+                pass
+        if not parts:
+            return pd.DataFrame(columns=["drugname", "total_customers", "avg_cost"])
+        totals = pd.concat(parts).groupby(level="drugname").sum()
+        return (
+            pd.DataFrame({
+                "total_customers": totals["total_customers"],
+                "avg_cost": totals["cost_sum"] / totals["cost_count"],
+            })
+            .reset_index()
+            .sort_values(by="total_customers", ascending=False)
+        )
+
+    def append(self, df):
+        """Fold newly appended raw rows into the rollups."""
+        usage, seasonal = aggregate(df)
+        self.usage_table = merge(self.usage_table, usage)
+        self.seasonal_table = merge(self.seasonal_table, seasonal)
+
+
+def _save_table(directory, name, table, names):
+    index = table.index
+    codes = {}
+    for level in index.names:
+        values = index.get_level_values(level)
+        if not pd.api.types.is_numeric_dtype(values):
+            cats = sorted(set(values))
+            names[f"{name}.{level}"] = cats
+            codes[level] = pd.Index(cats).get_indexer(values).astype(np.int32)
+        else:
+            codes[level] = values.to_numpy()
+    for level, arr in codes.items():
+        np.save(os.path.join(directory, f"{name}.{level}.npy"), arr)
+    for col in table.columns:
+        np.save(os.path.join(directory, f"{name}.{col}.npy"), table[col].to_numpy())
+
+
+def _load_table(directory, name, keys, values, names):
+    levels = []
+    for level in keys:
+        arr = np.load(os.path.join(directory, f"{name}.{level}.npy"))
+        key = f"{name}.{level}"
+        levels.append(np.asarray(names[key], dtype=object)[arr] if key in names else arr)
+    index = pd.MultiIndex.from_arrays(levels, names=keys)
+    data = {col: np.load(os.path.join(directory, f"{name}.{col}.npy")) for col in values}
+    return pd.DataFrame(data, index=index)
+
+
+def save(rollups, path, size, rows):
+    target = rollup_path(path)
+    os.makedirs(datastore.CACHE_DIR, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=datastore.CACHE_DIR, prefix=".build-")
+    names = {}
+    _save_table(tmp, "usage", rollups.usage_table, names)
+    _save_table(tmp, "seasonal", rollups.seasonal_table, names)
+    manifest = {
+        "version": ROLLUP_VERSION,
+        "dataset": os.path.basename(path),
+        "size": size,
+        "prefix_sha256": _prefix_hash(path, size),
+        "rows": rows,
+        "names": names,
+    }
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    # the same directory is refreshed as the CSV grows
+    artifacts.publish(tmp, target, replace=True)
+
+
+def _read_manifest(path):
+    try:
+        with open(os.path.join(rollup_path(path), "manifest.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get("version") == ROLLUP_VERSION else None
+
+
+def refresh(path=trend.DATA_PATH):
+    """Bring the stored rollups up to date with ``path``; returns a Rollups."""
+    size = os.path.getsize(path)
+    meta = _read_manifest(path)
+    if meta and meta["size"] <= size and _prefix_hash(path, meta["size"]) == meta["prefix_sha256"]:
+        directory = rollup_path(path)
+        rollups = Rollups(
+            _load_table(directory, "usage", USAGE_KEYS, USAGE_VALUES, meta["names"]),
+            _load_table(directory, "seasonal", SEASONAL_KEYS, SEASONAL_VALUES, meta["names"]),
+        )
+        if meta["size"] == size:
+            return rollups
+        # appended rows only: skip the ones already aggregated
+        tail = pd.read_csv(path, skiprows=range(1, meta["rows"] + 1))
+        rollups.append(tail)
+        rows = meta["rows"] + len(tail)
+    else:
+        df = datastore.load_frame(path, USAGE_KEYS + ["season", "drugcost"] + USAGE_VALUES)
+        rollups = Rollups(*aggregate(df))
+        rows = len(df)
+    save(rollups, path, size, rows)
+    return rollups
+
+
+def load_rollups(path=trend.DATA_PATH):
+    """Process-wide Rollups for the current contents of ``path``."""
+    key = (os.path.abspath(path), datastore.file_hash(path))
+    rollups = _loaded.get(key)
+    if rollups is None:
+        with artifacts.build_lock(rollup_path(path)):
+            rollups = _loaded.get(key)
+            if rollups is None:
+                rollups = _loaded[key] = refresh(path)
+    return rollups
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or refresh the trend rollup tables.")
+    parser.add_argument("csv", nargs="?", default=trend.DATA_PATH)
+    args = parser.parse_args(argv)
+    rollups = refresh(args.csv)
+    print(f"usage: {len(rollups.usage_table):,} rows  seasonal: {len(rollups.seasonal_table):,} rows"
+          f"  -> {rollup_path(args.csv)}")
+
+
+if __name__ == "__main__":
+    main()
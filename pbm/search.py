@@ -0,0 +1,120 @@
+"""In-memory medicine-name search for search-as-you-type.
+
+``NameIndex.search`` returns the best ``limit`` names for a partial, possibly
+misspelled query, case-insensitively:
+
+1. names starting with the query (binary search over the sorted names),
+2. names containing every query word,
+3. typo-tolerant matches ranked by trigram similarity.
+
+Posting lists are int32 arrays and a query only reads the rarest trigrams'
+lists up to a fixed budget of ids, so latency does not grow with the catalog.
+"""
+import bisect
+import re
+from collections import defaultdict
+
+import numpy as np
+
+from pbm import metrics
+
+POSTING_BUDGET = 20_000
+MIN_SIMILARITY = 0.2
+
+
+def trigrams(text):
+    padded = f"  {text.lower().strip()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class NameIndex:
+    def __init__(self, names):
+        self.names = []
+        self._lower = []
+        self._ids = {}
+        for name in names:
+            self._append(name)
+        self._sorted = sorted(zip(self._lower, range(len(self._lower))))
+        postings = defaultdict(list)
+        for i, name in enumerate(self._lower):
+            for gram in trigrams(name):
+                postings[gram].append(i)
+        self._postings = {g: np.array(ids, dtype=np.int32) for g, ids in postings.items()}
+        self._gram_counts = np.array([len(trigrams(n)) for n in self._lower], dtype=np.int32)
+        self._recent = []
+
+    def _append(self, name):
+        name = str(name)
+        if name in self._ids:
+            return None
+        self._ids[name] = len(self.names)
+        self.names.append(name)
+        self._lower.append(name.lower())
+        return self._ids[name]
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+    def add(self, name):
+        """Make a newly inserted name searchable without rebuilding."""
+        i = self._append(name)
+        if i is not None:
+            bisect.insort(self._sorted, (self._lower[i], i))
+            self._recent.append(i)
+
+    def prefix(self, query, limit=10):
+        q = query.lower().strip()
+        pos = bisect.bisect_left(self._sorted, (q, -1))
+        out = []
+        while pos < len(self._sorted) and len(out) < limit:
+            lower, i = self._sorted[pos]
+            if not lower.startswith(q):
+                break
+            out.append(i)
+            pos += 1
+        return out
+
+    def _fuzzy(self, query, limit):
+        grams = trigrams(query)
+        lists = sorted((self._postings[g] for g in grams if g in self._postings), key=len)
+        # rarest grams first, until the posting volume budget is spent
+        budget, used = POSTING_BUDGET, []
+        for p in lists:
+            if used and len(p) > budget:
+                break
+            used.append(p)
+            budget -= len(p)
+        if used:
+            cand, hits = np.unique(np.concatenate(used), return_counts=True)
+            score = hits / (len(used) + self._gram_counts[cand] * len(used) / len(grams) - hits)
+            keep = score >= MIN_SIMILARITY
+            cand, score = cand[keep], score[keep]
+            top = np.argsort(-score, kind="stable")[:limit]
+            scored = list(zip(score[top].tolist(), cand[top].tolist()))
+        else:
+            scored = []
+        for i in self._recent:
+            g = trigrams(self._lower[i])
+            s = len(grams & g) / len(grams | g)
+            if s >= MIN_SIMILARITY:
+                scored.append((s, i))
+        scored.sort(key=lambda x: -x[0])
+        return [i for _, i in scored[:limit]]
+
+    @metrics.timed("search.query")
+    def search(self, query, limit=10):
+        """Up to ``limit`` names matching ``query``, best first."""
+        q = query.lower().strip()
+        if not q:
+            return []
+        found = self.prefix(q, limit)
+        if len(found) < limit:
+            words = re.findall(r"\w+", q)
+            seen = set(found)
+            fuzzy = [i for i in self._fuzzy(q, limit * 4) if i not in seen]
+            found += [i for i in fuzzy if all(w in self._lower[i] for w in words)]
+            found += [i for i in fuzzy if not all(w in self._lower[i] for w in words)]
+        return [self.names[i] for i in found[:limit]]
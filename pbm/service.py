@@ -0,0 +1,284 @@
+"""JSON HTTP service for formulary lookups, recommendations and forecasts.
+
+    python -m pbm.service --port 8765
+
+Endpoints (all responses are JSON):
+
+    GET  /health
+    GET  /lookup?medicine=NAME
+    POST /lookup/batch        {"medicines": [...]}
+    GET  /recommend?medicine=NAME
+    POST /recommend/batch     {"medicines": [...]}
+    GET  /forecast?drug=NAME&year=2026&months=1,2,3[&seed=0]
+    GET  /forecast/simulate?drug=NAME&year=2026[&months=...&n=1000&seed=0]
+    GET  /metrics             per-process timings and cache counters
+
+The server is a small asyncio HTTP/1.1 loop with keep-alive.  Handlers run on
+a thread pool and share one warm ``Service`` (index, model, data) per process.
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from pbm import datastore, db, formulary_db, metrics, models, trend
+from pbm.recommend import Recommender
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Service:
+    """Business logic with lazily loaded, process-wide shared resources."""
+
+    def __init__(self, csv_path=datastore.FORMULARY_CSV, db_file=formulary_db.DB_FILE,
+                 model_path=trend.MODEL_PATH, trend_path=trend.DATA_PATH):
+        self.csv_path = csv_path
+        self.db_file = db_file
+        self.model_path = model_path
+        self.trend_path = trend_path
+        self._lock = threading.Lock()
+        self._recommender = None
+        self._model = None
+        self._trend_df = None
+
+    def warm(self):
+        db.get_database(self.db_file)
+        self.recommender
+        self.model
+        self.trend_df
+        return self
+
+    @property
+    def recommender(self):
+        with self._lock:
+            if self._recommender is None:
+                self._recommender = Recommender.load(self.csv_path)
+            return self._recommender
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                self._model = models.get_model(self.model_path)
+            return self._model
+
+    @property
+    def trend_df(self):
+        with self._lock:
+            if self._trend_df is None:
+                self._trend_df = datastore.load_frame(self.trend_path, categorical=True)
+            return self._trend_df
+
+    def lookup(self, medicine):
+        with db.get_database(self.db_file).reader() as conn:
+            return formulary_db.get_drug_info(conn, medicine.strip())
+
+    def lookup_batch(self, medicines):
+        with db.get_database(self.db_file).reader() as conn:
+            return formulary_db.get_drug_info_batch(conn, [m.strip() for m in medicines])
+
+    def _synced_recommender(self):
+        recommender = self.recommender
+        recommender.sync(db.get_database(self.db_file))
+        return recommender
+
+    def recommend(self, medicine):
+        return self._synced_recommender().recommend(medicine)
+
+    def recommend_batch(self, medicines):
+        return list(self._synced_recommender().recommend_many(medicines))
+
+    def forecast(self, drug, year, months, seed=None):
+        loaded = self.model
+        rng = np.random.default_rng(seed) if seed is not None else np.random
+        future_df = trend.forecast(self.trend_df, loaded.predictor, loaded.encoders, drug, year, months, rng)
+        if future_df is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No history for drug '{drug}'")
+        return {
+            "drug": drug,
+            "year": year,
+            "months": future_df[["Month", "no_of_customer_using_drug", "drugcost"]].to_dict(orient="records"),
+        }
+
+    def simulate(self, drug, year, months, seed=None, n=trend.SCENARIOS):
+        loaded = self.model
+        # large batches go to sklearn, smaller ones to the shared compiled forest
+        predictor = loaded.batch_predictor(n * len(months))
+        bands = trend.simulate(self.trend_df, predictor, loaded.encoders, drug, year, months, n, seed)
+        if bands is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No history for drug '{drug}'")
+        return {"drug": drug, "year": year, "scenarios": n, "seed": seed,
+                "months": bands.to_dict(orient="records")}
+
+
+def _param(query, name, required=True):
+    values = query.get(name)
+    if not values:
+        if required:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"missing query parameter '{name}'")
+        return None
+    return values[0]
+
+
+def _medicines(body):
+    medicines = body.get("medicines") if isinstance(body, dict) else None
+    if not isinstance(medicines, list):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "body must be {\"medicines\": [...]}")
+    return [str(m) for m in medicines]
+
+
+def _forecast_args(query):
+    try:
+        year = int(_param(query, "year"))
+        months = [int(m) for m in (_param(query, "months", False) or "1,2,3,4,5,6,7,8,9,10,11,12").split(",")]
+        seed = _param(query, "seed", False)
+        seed = int(seed) if seed is not None else None
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "year, months and seed must be integers")
+    return _param(query, "drug"), year, months, seed
+
+
+def _scenarios(query):
+    n = _param(query, "n", False)
+    try:
+        n = int(n) if n is not None else trend.SCENARIOS
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "n must be an integer")
+    if not 1 <= n <= 100_000:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "n must be between 1 and 100000")
+    return n
+
+
+ROUTES = {
+    ("GET", "/health"): lambda svc, q, b: {"status": "ok"},
+    ("GET", "/metrics"): lambda svc, q, b: metrics.snapshot(),
+    ("GET", "/lookup"): lambda svc, q, b: svc.lookup(_param(q, "medicine")),
+    ("POST", "/lookup/batch"): lambda svc, q, b: svc.lookup_batch(_medicines(b)),
+    ("GET", "/recommend"): lambda svc, q, b: svc.recommend(_param(q, "medicine")),
+    ("POST", "/recommend/batch"): lambda svc, q, b: svc.recommend_batch(_medicines(b)),
+    ("GET", "/forecast"): lambda svc, q, b: svc.forecast(*_forecast_args(q)),
+    ("GET", "/forecast/simulate"): lambda svc, q, b: svc.simulate(*_forecast_args(q), n=_scenarios(q)),
+}
+
+
+def _default(o):
+    if isinstance(o, np.generic):
+        return o.item()
+    raise TypeError(f"{type(o).__name__} is not JSON serializable")
+
+
+def dispatch(service, method, target, body):
+    """Route one request; returns (status, payload)."""
+    url = urlsplit(target)
+    handler = ROUTES.get((method, url.path))
+    if handler is None:
+        if any(path == url.path for _, path in ROUTES):
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"{method} not allowed"}
+        return HTTPStatus.NOT_FOUND, {"error": f"no route {url.path}"}
+    try:
+        payload = json.loads(body) if body else None
+    except ValueError:
+        return HTTPStatus.BAD_REQUEST, {"error": "invalid JSON body"}
+    try:
+        return HTTPStatus.OK, handler(service, parse_qs(url.query), payload)
+    except HTTPError as e:
+        return e.status, {"error": str(e)}
+
+
+async def _handle(reader, writer, service, executor):
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            try:
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+            except ValueError:
+                break
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b"\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                headers[key.strip().lower()] = value.strip()
+            length = int(headers.get("content-length") or 0)
+            body = await reader.readexactly(length) if length else b""
+
+            try:
+                status, payload = await loop.run_in_executor(
+                    executor, dispatch, service, method.upper(), target, body
+                )
+            except Exception as e:
+                status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": repr(e)}
+            data = json.dumps(_scrub(payload), default=_default).encode()
+
+            keep_alive = headers.get("connection", "").lower() != "close"
+            writer.write(
+                f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                f"Content-Type: application/json\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data
+            )
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+def _scrub(o):
+    """Replace NaN/inf with None so the payload is valid JSON."""
+    if isinstance(o, dict):
+        return {k: _scrub(v) for k, v in o.items()}
+    if isinstance(o, (list, tuple)):
+        return [_scrub(v) for v in o]
+    if isinstance(o, (float, np.floating)) and not np.isfinite(o):
+        return None
+    return o
+
+
+async def serve(service, host="127.0.0.1", port=8765, workers=8):
+    executor = ThreadPoolExecutor(max_workers=workers)
+    server = await asyncio.start_server(
+        lambda r, w: _handle(r, w, service, executor), host, port
+    )
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Formulary JSON HTTP service.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--no-warm", action="store_true", help="load index and model on first request")
+    args = parser.parse_args(argv)
+
+    service = Service()
+    if not args.no_warm:
+        start = time.perf_counter()
+        service.warm()
+        print(f"warm in {time.perf_counter() - start:.2f}s")
+    print(f"listening on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(serve(service, args.host, args.port, args.workers))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""Process start-up: deferred heavy imports and a background warm-up.
+
+Heavy libraries (scikit-learn, matplotlib) are only imported inside the code
+paths that need them, so a page that never fits an index or draws a chart
+never pays for them.  ``warm_up()`` is called by ``app.py`` and every page; the
+first call in a process starts one daemon thread that
+
+1. imports the heavy modules, timing each one, and
+2. builds or opens every on-disk artifact a first visitor would otherwise
+   wait for: the columnar dataset caches, the compact formulary frame, the
+   equivalence index with its normalized embeddings and neighbor table, the
+   trend model export, the forecast cube, the rollups and the background
+   images.
+
+Every artifact loader holds a per-artifact lock (``pbm.artifacts``) while it
+builds, so a page that asks for something the warm-up is still building waits
+for that build instead of starting a second one.
+
+The large artifacts are memory-mapped, so when several app processes run on
+one host, run ``python -m pbm.startup`` once before starting them: it builds
+everything, and each worker then only maps the shared files.
+
+Each step's duration (or error) is logged to ``pbm.startup`` and kept for
+``report()``.
+
+    python -m pbm.startup    # run the warm-up in the foreground and print the report
+"""
+import importlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger("pbm.startup")
+
+HEAVY_MODULES = (
+    "numpy",
+    "pandas",
+    "sklearn.feature_extraction.text",
+    "sklearn.decomposition",
+    "matplotlib.figure",
+)
+
+_timings = []
+_started = threading.Event()
+_done = threading.Event()
+_lock = threading.Lock()
+
+
+@contextmanager
+def timed(kind, name):
+    """Record how long the block takes as a ``kind`` step called ``name``."""
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        with _lock:
+            _timings.append({"kind": kind, "name": name, "seconds": round(seconds, 4), "error": error})
+        if error:
+            log.warning("%s %s failed after %.3fs: %s", kind, name, seconds, error)
+        else:
+            log.info("%s %s: %.3fs", kind, name, seconds)
+
+
+def _steps():
+    from pbm import assets, cube, datastore, models, recommend, rollups, trend
+
+    return [
+        ("formulary dataset cache", lambda: datastore.open_store(datastore.FORMULARY_CSV)),
+        ("trend dataset cache", lambda: datastore.open_store(datastore.TREND_CSV)),
+        ("equivalence index", lambda: recommend.Recommender.load(datastore.FORMULARY_CSV).index.knn),
+        ("trend model", lambda: models.get_model(trend.MODEL_PATH)),
+        ("forecast cube", lambda: cube.load_cube(trend.MODEL_PATH, trend.DATA_PATH)),
+        ("trend rollups", lambda: rollups.load_rollups(trend.DATA_PATH)),
+        ("background images", lambda: [assets.prepare(p) for p in assets.BACKGROUNDS]),
+    ]
+
+
+def _run():
+    start = time.perf_counter()
+    for name in HEAVY_MODULES:
+        try:
+            with timed("import", name):
+                importlib.import_module(name)
+        except Exception:
+            pass
+    for name, step in _steps():
+        try:
+            with timed("init", name):
+                step()
+        except Exception:
+            pass
+    log.info("warm-up finished in %.3fs", time.perf_counter() - start)
+    _done.set()
+
+
+def warm_up(background=True):
+    """Start the warm-up once per process; later calls return immediately."""
+    with _lock:
+        if _started.is_set():
+            return
+        _started.set()
+    if not log.handlers and not logging.getLogger().handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        log.addHandler(handler)
+        log.setLevel(logging.INFO)
+    if background:
+        threading.Thread(target=_run, name="pbm-warm-up", daemon=True).start()
+    else:
+        _run()
+
+
+def wait(timeout=None):
+    """Block until the warm-up has finished; False on timeout."""
+    return _done.wait(timeout)
+
+
+def report():
+    with _lock:
+        return list(_timings)
+
+
+def format_report(rows=None):
+    rows = report() if rows is None else rows
+    lines = [f"{'step':<8} {'name':<34} {'seconds':>8}"]
+    for r in rows:
+        status = f"  ({r['error']})" if r["error"] else ""
+        lines.append(f"{r['kind']:<8} {r['name']:<34} {r['seconds']:>8.3f}{status}")
+    return "\n".join(lines)
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    warm_up(background=False)
+    print(format_report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Drug cost trend forecasting with the saved random forest.
+
+Pure functions behind the "Predict Future Trend" view: derive a drug's
+baseline from its history, build the future feature frame, encode it with
+the saved label encoders and predict ``drugcost``.  ``simulate`` runs the same
+forecast for many seeded perturbation scenarios in one batched predict and
+returns percentile bands.
+"""
+import pickle
+
+import numpy as np
+import pandas as pd
+
+from pbm import encoding, metrics
+
+MODEL_PATH = "data/drug_trend3rd.pkl"
+DATA_PATH = "data/synthetic_drug_data_with_year_month.csv"
+
+CAT_COLS = ["season", "drugname", "alternatedrug", "YearMonth"]
+VARIATION = 0.1
+SCENARIOS = 1000
+PERCENTILES = (5, 50, 95)
+
+
+def load_model(path=MODEL_PATH):
+    """Return ``(model, encoders)`` from the pickled training output."""
+    with open(path, "rb") as f:
+        saved = pickle.load(f)
+    return saved["model"], saved["encoders"]
+
+
+def baseline(drug_df):
+    """Typical feature values of one drug: modes, and the mean alternate cost."""
+    return {
+        "season": drug_df["season"].mode()[0],
+        "alternatedrug": drug_df["alternatedrug"].mode()[0],
+        "alternatedrugcost": drug_df["alternatedrugcost"].mean(),
+        "no_of_customer_using_drug": drug_df["no_of_customer_using_drug"].mode()[0],
+        "no_of_customer_using_alternate_drug": drug_df["no_of_customer_using_alternate_drug"].mode()[0],
+    }
+
+
+def future_frame(drug, year, months, avg_values, rng=np.random, variation=VARIATION):
+    """Raw (unencoded) feature rows for ``drug`` in ``year`` and ``months``."""
+    return pd.DataFrame({
+        "season": [avg_values["season"]] * len(months),
+        "drugname": [drug] * len(months),
+        "alternatedrug": [avg_values["alternatedrug"]] * len(months),
+        "alternatedrugcost": [
+            np.round(avg_values["alternatedrugcost"] * rng.uniform(1 - variation, 1 + variation), 2)
+            for _ in months
+        ],
+        "no_of_customer_using_drug": [
+            int(avg_values["no_of_customer_using_drug"] * rng.uniform(1 - variation, 1 + variation))
+            for _ in months
+        ],
+        "no_of_customer_using_alternate_drug": [
+            int(avg_values["no_of_customer_using_alternate_drug"] * rng.uniform(1 - variation, 1 + variation))
+            for _ in months
+        ],
+        "Year": [year] * len(months),
+        "Month": list(months),
+        "YearMonth": [f"{year}-{m:02d}" for m in months],
+    })
+
+
+def encode(future_df, encoders, unknown=encoding.UNKNOWN_FIRST):
+    """Label-encode the categorical columns in place; unseen values map to class 0."""
+    return encoding.encode_frame(future_df, encoders, CAT_COLS, unknown)
+
+
+@metrics.timed("trend.forecast")
+def forecast(df, model, encoders, drug, year, months, rng=np.random):
+    """Encoded future frame with a ``drugcost`` prediction per month.
+
+    Returns None when ``drug`` has no history in ``df``.
+    """
+    drug_df = df[df["drugname"] == drug]
+    if drug_df.empty:
+        return None
+    future_df = encode(future_frame(drug, year, months, baseline(drug_df), rng), encoders)
+    future_df["drugcost"] = model.predict(future_df)
+    return future_df
+
+
+def scenario_frame(drug, year, months, avg_values, n, rng, variation=VARIATION):
+    """``future_frame`` for ``n`` scenarios stacked scenario-major, as one frame.
+
+    Constant columns are categorical so encoding touches one value each.
+    """
+    months = list(months)
+    shape = (n, len(months))
+
+    def perturbed(col):
+        return avg_values[col] * rng.uniform(1 - variation, 1 + variation, shape)
+
+    def constant(value):
+        return pd.Categorical.from_codes(np.zeros(n * len(months), dtype=np.int8), [value])
+
+    return pd.DataFrame({
+        "season": constant(avg_values["season"]),
+        "drugname": constant(drug),
+        "alternatedrug": constant(avg_values["alternatedrug"]),
+        "alternatedrugcost": np.round(perturbed("alternatedrugcost"), 2).ravel(),
+        "no_of_customer_using_drug": perturbed("no_of_customer_using_drug").astype(int).ravel(),
+        "no_of_customer_using_alternate_drug": perturbed("no_of_customer_using_alternate_drug").astype(int).ravel(),
+        "Year": np.full(n * len(months), year),
+        "Month": np.tile(months, n),
+        "YearMonth": pd.Categorical.from_codes(
+            np.tile(np.arange(len(months)), n), [f"{year}-{m:02d}" for m in months]),
+    })
+
+
+@metrics.timed("trend.simulate")
+def simulate(df, model, encoders, drug, year, months, n=SCENARIOS, seed=None,
+             percentiles=PERCENTILES, variation=VARIATION):
+    """Per-month ``drugcost`` percentiles over ``n`` seeded perturbation scenarios.
+
+    Returns a frame with ``Month``, ``mean``, one ``p<q>`` column per percentile
+    and the median ``no_of_customer_using_drug``; None when ``drug`` has no
+    history in ``df``.
+    """
+    drug_df = df[df["drugname"] == drug]
+    if drug_df.empty:
+        return None
+    months = list(months)
+    rng = np.random.default_rng(seed)
+    features = encode(scenario_frame(drug, year, months, baseline(drug_df), n, rng, variation), encoders)
+    costs = np.asarray(model.predict(features)).reshape(n, len(months))
+    customers = features["no_of_customer_using_drug"].to_numpy().reshape(n, len(months))
+    bands = np.percentile(costs, percentiles, axis=0)
+    out = pd.DataFrame({"Month": months, "mean": costs.mean(axis=0)})
+    for q, band in zip(percentiles, bands):
+        out[f"p{q:g}"] = band
+    out["no_of_customer_using_drug"] = np.median(customers, axis=0)
+    return out